@@ -4,6 +4,7 @@ import csv
 from typing import List, Dict, Any, Iterator
 import pandas as pd
 from neo4j import GraphDatabase
+from fastembed import TextEmbedding
 from dotenv import load_dotenv
 load_dotenv()
 try:
@@ -91,6 +92,30 @@ MERGE (c)-[r:INCLUT]->(g)
 SET r.capital_assure = row.capital_assure
 """
 
+# Embeddings of Garantie and Produit texts, searched by Neo4jAgent.search_guarantees
+# (same default fastembed model as the app, so query and node vectors are comparable)
+VECTOR_INDEXES = {"Garantie": "garantie_embedding", "Produit": "produit_embedding"}
+
+CYPHER_GARANTIE_TEXTS = """
+MATCH (g:Garantie)
+RETURN elementId(g) AS id, g.lib_garantie AS name, g.description AS description
+"""
+
+CYPHER_PRODUIT_TEXTS = """
+MATCH (p:Produit)
+OPTIONAL MATCH (p)-[:EST_UN_PRODUIT_DE]->(sb:SousBranche)-[:EST_UNE_SOUS_BRANCHE_DE]->(b:Branche)
+OPTIONAL MATCH (p)-[:OFFRE]->(g:Garantie)
+RETURN elementId(p) AS id, p.lib_produit AS name,
+       collect(DISTINCT b.lib_branche + ' / ' + sb.lib_sous_branche) AS branches,
+       collect(DISTINCT g.lib_garantie) AS garanties
+"""
+
+CYPHER_SET_EMBEDDINGS = """
+UNWIND $rows AS row
+MATCH (n) WHERE elementId(n) = row.id
+CALL db.create.setNodeVectorProperty(n, 'embedding', row.vector)
+"""
+
 # -----------------------------
 # Loading logic
 # -----------------------------
@@ -134,6 +159,43 @@ def load_contrat_garanties(driver, database: str, df: pd.DataFrame, batch_size:
         })
     _execute_batches(driver, database, CYPHER_CONTRAT_GARANTIES, rows, batch_size, "Contrat-Garanties", progress)
 
+
+def garantie_text(row: Dict[str, Any]) -> str:
+    return f"{row['name']} : {row['description']}" if row.get("description") else str(row["name"])
+
+
+def produit_text(row: Dict[str, Any]) -> str:
+    parts = [str(row["name"])]
+    if row["branches"]:
+        parts.append(f"({', '.join(row['branches'])})")
+    if row["garanties"]:
+        parts.append(f"Garanties : {', '.join(row['garanties'])}")
+    return " ".join(parts)
+
+
+def create_vector_indexes(session, dim: int):
+    for label, index in VECTOR_INDEXES.items():
+        session.run(
+            f"CREATE VECTOR INDEX {index} IF NOT EXISTS FOR (n:{label}) ON (n.embedding) "
+            f"OPTIONS {{indexConfig: {{`vector.dimensions`: {dim}, `vector.similarity_function`: 'cosine'}}}}"
+        )
+
+
+def embed_nodes(driver, database: str, batch_size: int, progress: bool = True):
+    """Embed Garantie descriptions and Produit summaries in batches and store them as node vectors."""
+    model = TextEmbedding()
+    with driver.session(database=database) as session:
+        create_vector_indexes(session, len(next(iter(model.embed(["test"])))))
+        garanties = [r.data() for r in session.run(CYPHER_GARANTIE_TEXTS)]
+        produits = [r.data() for r in session.run(CYPHER_PRODUIT_TEXTS)]
+
+    for desc, rows, to_text in (("Garantie embeddings", garanties, garantie_text),
+                                ("Produit embeddings", produits, produit_text)):
+        rows = [r for r in rows if r["name"]]
+        vectors = model.embed([to_text(r) for r in rows], batch_size=256)
+        updates = [{"id": r["id"], "vector": v.tolist()} for r, v in zip(rows, vectors)]
+        _execute_batches(driver, database, CYPHER_SET_EMBEDDINGS, updates, batch_size, desc, progress)
+
 # -----------------------------
 # Main
 # -----------------------------
@@ -158,6 +220,7 @@ def main():
     parser.add_argument("--database", default="neo4j", help="Database name (default: neo4j for Neo4j Desktop)")
     parser.add_argument("--batch-size", type=int, default=1000)
     parser.add_argument("--no-progress", action="store_true", help="Disable tqdm progress bars")
+    parser.add_argument("--skip-embeddings", action="store_true", help="Do not (re)compute the Garantie/Produit vector embeddings")
     args = parser.parse_args()
 
     garanties_path = args.garanties
@@ -251,6 +314,8 @@ def main():
     # Load data
     load_garanties(driver, args.database, df_garanties, args.batch_size, progress=not args.no_progress)
     load_contrat_garanties(driver, args.database, df_contrat_garanties, args.batch_size, progress=not args.no_progress)
+    if not args.skip_embeddings:
+        embed_nodes(driver, args.database, args.batch_size, progress=not args.no_progress)
 
     driver.close()
     print("Additional load completed successfully.")
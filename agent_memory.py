@@ -0,0 +1,209 @@
+import os
+import re
+import json
+import base64
+import math
+import heapq
+import itertools
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+from embedding_cache import normalize_text
+
+load_dotenv()
+
+AGENT_MEMORY_MAX = int(os.getenv("AGENT_MEMORY_MAX", 5000))
+# With embeddings, the lexical overlap only breaks ties between equally close questions
+MEMORY_LEXICAL_WEIGHT = float(os.getenv("MEMORY_LEXICAL_WEIGHT", 0.1))
+
+# Stored entries without an embedding (legacy file, older stream entries) are embedded
+# in the background, this many per call to the embedding service
+MEMORY_EMBED_BATCH = int(os.getenv("MEMORY_EMBED_BATCH", 64))
+
+# Redis stream shared by the workers; trimmed (approximately) to AGENT_MEMORY_MAX entries
+AGENT_MEMORY_STREAM = os.getenv("AGENT_MEMORY_STREAM", "agent:memory")
+
+TOKEN_RE = re.compile(r"[a-z_]+")
+
+
+def memory_tokens(question: str) -> frozenset[str]:
+    # Identifiers (client, contract, claim numbers) never help pick a similar question
+    return frozenset(t for t in TOKEN_RE.findall(normalize_text(question)) if len(t) > 3)
+
+
+class MemoryIndex:
+    """
+    Successful (question, Cypher) pairs of the Neo4j agent, indexed for few-shot
+    selection. Question tokens are computed once, on insert, into an inverted index,
+    so a lookup only scores the entries sharing a token with the question (IDF
+    weighted). Entries given a question embedding are ranked by cosine similarity
+    instead, the lexical score breaking ties; those still waiting for one keep
+    competing on their lexical score. A question asked again replaces its older
+    entry; past `max_entries` the oldest go first.
+    """
+
+    def __init__(self, max_entries: int = AGENT_MEMORY_MAX, lexical_weight: float = MEMORY_LEXICAL_WEIGHT):
+        self.max_entries = max_entries
+        self.lexical_weight = lexical_weight
+        self._entries: OrderedDict[int, dict] = OrderedDict()
+        self._tokens: dict[int, frozenset[str]] = {}
+        self._postings: dict[str, set[int]] = {}
+        self._vectors: dict[int, np.ndarray] = {}
+        # Entries still waiting for an embedding, oldest first
+        self._missing: OrderedDict[int, str] = OrderedDict()
+        self._by_question: dict[str, int] = {}
+        # (entry ids, stacked unit vectors), rebuilt on the first search after a change
+        self._matrix: tuple[list[int], np.ndarray] | None = None
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def entries(self) -> list[dict]:
+        """Entries oldest first, as persisted."""
+        return list(self._entries.values())
+
+    def add(self, entry: dict, vector: np.ndarray | None = None):
+        question = normalize_text(entry["query"])
+        previous = self._by_question.get(question)
+        if previous is not None:
+            if vector is None:
+                vector = self._vectors.get(previous)
+            self._remove(previous)
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = entry
+        self._by_question[question] = entry_id
+        tokens = memory_tokens(entry["query"])
+        self._tokens[entry_id] = tokens
+        for token in tokens:
+            self._postings.setdefault(token, set()).add(entry_id)
+        if vector is not None:
+            self.set_vector(entry_id, vector)
+        else:
+            self._missing[entry_id] = entry["query"]
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        self._by_question.pop(normalize_text(entry["query"]), None)
+        self._missing.pop(entry_id, None)
+        for token in self._tokens.pop(entry_id):
+            ids = self._postings[token]
+            ids.discard(entry_id)
+            if not ids:
+                del self._postings[token]
+        if self._vectors.pop(entry_id, None) is not None:
+            self._matrix = None
+
+    def set_vector(self, entry_id: int, vector: np.ndarray):
+        if entry_id not in self._entries:
+            # Evicted or replaced while it was being embedded
+            return
+        self._missing.pop(entry_id, None)
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        self._vectors[entry_id] = vector / norm if norm else vector
+        self._matrix = None
+
+    def missing_vectors(self, limit: int | None = None) -> list[tuple[int, str]]:
+        """(entry id, question) of the oldest `limit` entries without an embedding, e.g. loaded from disk."""
+        return list(itertools.islice(self._missing.items(), limit))
+
+    def _idf(self, tokens: frozenset[str]) -> dict[str, float]:
+        total = len(self._entries)
+        return {t: math.log(1 + total / len(self._postings[t])) for t in tokens if t in self._postings}
+
+    def _overlap(self, entry_id: int, idf: dict[str, float]) -> float:
+        return sum(idf[t] for t in self._tokens[entry_id] & idf.keys())
+
+    def _lexical_scores(self, idf: dict[str, float]) -> dict[int, float]:
+        # Candidates come from the rarer words: those found in a quarter of the entries or more
+        # ("client", "quel") would pull in much of the index, they only add to the candidates' score
+        rare = [t for t in idf if 4 * len(self._postings[t]) <= len(self._entries)] or list(idf)
+        candidates = set().union(*(self._postings[t] for t in rare)) if rare else set()
+        return {entry_id: self._overlap(entry_id, idf) for entry_id in candidates}
+
+    def search(self, question: str, k: int = 3, vector: np.ndarray | None = None) -> list[dict]:
+        """The `k` stored entries closest to `question`, best first."""
+        if not self._entries:
+            return []
+        idf = self._idf(memory_tokens(question))
+        if vector is not None and self._vectors:
+            if self._matrix is None:
+                ids = list(self._vectors)
+                self._matrix = (ids, np.stack([self._vectors[i] for i in ids]))
+            ids, matrix = self._matrix
+            query = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(query)
+            similarities = matrix @ (query / norm if norm else query)
+            # The lexical tie-break only needs to look at the closest few
+            shortlist = min(len(ids), 10 * k)
+            candidates = np.argpartition(-similarities, shortlist - 1)[:shortlist]
+            top_lexical = sum(idf.values()) or 1.0
+            scored = [
+                (float(similarities[pos]) + self.lexical_weight * self._overlap(ids[pos], idf) / top_lexical,
+                 ids[pos])
+                for pos in candidates
+            ]
+            if self._missing:
+                # Entries not embedded yet compete on their word overlap, scaled like a similarity
+                # (1.0 when they share every word of the question)
+                scored += [(score / top_lexical, i) for i, score in self._lexical_scores(idf).items()
+                           if i in self._missing]
+            ranked = heapq.nlargest(k, scored)
+        else:
+            ranked = heapq.nlargest(k, ((score, i) for i, score in self._lexical_scores(idf).items()))
+        return [self._entries[i] for _, i in ranked]
+
+
+class MemoryLog:
+    """
+    Append-only store of the agent memory, shared by all workers: a Redis stream
+    of JSON entries. Each worker appends what it learns as it happens and pulls
+    the entries added since its last read into its own MemoryIndex, so nothing
+    is lost on a crash and no worker waits for shutdown to share its examples.
+    An entry carries the question embedding (base64 float32) of the worker that
+    learned it, so the others do not embed it again; vectors of another
+    `model_name` are ignored. `redis_client` must be created with decode_responses=True.
+    """
+
+    def __init__(self, redis_client, stream: str = AGENT_MEMORY_STREAM, max_entries: int = AGENT_MEMORY_MAX,
+                 model_name: str = "default"):
+        self.redis = redis_client
+        self.stream = stream
+        self.max_entries = max_entries
+        self.model_name = model_name
+
+    async def append(self, entry: dict, vector: np.ndarray | None = None) -> str:
+        fields = {"entry": json.dumps(entry, ensure_ascii=False)}
+        if vector is not None:
+            fields["vector"] = base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+            fields["model"] = self.model_name
+        return await self.redis.xadd(self.stream, fields, maxlen=self.max_entries, approximate=True)
+
+    def _vector(self, fields: dict) -> np.ndarray | None:
+        if "vector" not in fields or fields.get("model") != self.model_name:
+            return None
+        return np.frombuffer(base64.b64decode(fields["vector"]), dtype=np.float32)
+
+    async def read_since(self, last_id: str | None = None) -> list[tuple[str, dict, np.ndarray | None]]:
+        """
+        (stream id, entry, question vector or None) of the entries appended after
+        `last_id`, oldest first; all of them for None.
+        """
+        start = f"({last_id}" if last_id else "-"
+        return [(entry_id, json.loads(fields["entry"]), self._vector(fields))
+                for entry_id, fields in await self.redis.xrange(self.stream, min=start)]
+
+    async def seed(self, entries: list[dict]) -> bool:
+        """Import entries (e.g. the legacy agent_memory.json) once: only the first worker to ask does it."""
+        if not entries or not await self.redis.set(f"{self.stream}:seeded", 1, nx=True):
+            return False
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for entry in entries[-self.max_entries:]:
+                pipe.xadd(self.stream, {"entry": json.dumps(entry, ensure_ascii=False)},
+                          maxlen=self.max_entries, approximate=True)
+            await pipe.execute()
+        return True
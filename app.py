@@ -2,11 +2,24 @@ from fastapi import FastAPI
 from redis.asyncio import Redis
 from dotenv import load_dotenv
 import os
-from final_agent import initialize_embedding_model, Neo4jAgent
+from final_agent import initialize_embedding_model, Neo4jAgent, NEO4J_DATABASE
+from clients import ServiceClients
+from embedding_service import EmbeddingService
+from embedding_cache import EmbeddingCache
+from semantic_cache import SemanticCache
+from taxonomy import load_taxonomy
+from retrieval import create_retriever, RETRIEVAL_MODE, RETRIEVER_BACKEND, initialize_sparse_model
+from context_builder import ContextBuilder
+from conversation_memory import ConversationMemory
+from cypher_cache import CypherCache
+from agent_memory import MemoryLog
+from client_context import ClientContextStore
+from llm_monitor import LLMLoadMonitor
 from routes.query_routes import get_query_router
 from routes.auth_routes import get_auth_router
 from routes.history_routes import get_user_chats_router
 from routes.user_routes import get_user_router
+from routes.metrics_routes import get_metrics_router
 from database import database
 from pydantic import BaseModel
 from routes.devis_route  import router as devis_router
@@ -32,26 +45,64 @@ app.add_middleware(
 class QueryRequest(BaseModel):
     query: str
 redis_client: Redis = None
+binary_redis_client: Redis = None
 embedding_model = None
+embedding_service: EmbeddingService = None
+sparse_embedding_service: EmbeddingService = None
 neo4j_agent = None
+clients: ServiceClients = None
 @app.on_event("startup")
 async def startup_event():
-    global embedding_model, neo4j_agent , redis_client
+    global embedding_model, embedding_service, sparse_embedding_service, neo4j_agent , redis_client, binary_redis_client, clients
+    redis_client = Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+    # Raw bytes (embedding vectors) need a client that does not decode responses
+    binary_redis_client = Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=False)
     embedding_model = initialize_embedding_model()
+    embedding_cache = EmbeddingCache(binary_redis_client, model_name=getattr(embedding_model, "model_name", "default"))
+    embedding_service = EmbeddingService(embedding_model, cache=embedding_cache)
+    await embedding_service.start()
+    if RETRIEVAL_MODE == "hybrid" and RETRIEVER_BACKEND == "qdrant":
+        sparse_embedding_service = EmbeddingService(initialize_sparse_model(), method="query_embed")
+        await sparse_embedding_service.start()
     await database.connect()
-    neo4j_agent = Neo4jAgent(memory_enabled=True)
-    redis_client = Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+    clients = ServiceClients()
+    await clients.start()
+    # Shared with the agent, so its Cypher calls count towards the load the product routes see
+    llm_monitor = LLMLoadMonitor()
+    neo4j_agent = Neo4jAgent(memory_enabled=True, driver=clients.neo4j_driver, http_client=clients.ollama,
+                             cypher_cache=CypherCache(redis_client), embedding_service=embedding_service,
+                             memory_log=MemoryLog(redis_client, model_name=embedding_cache.model_name),
+                             llm_monitor=llm_monitor)
+    await neo4j_agent.warm_memory()
+    semantic_cache = SemanticCache(clients.qdrant)
+    taxonomy = await load_taxonomy(clients.neo4j_driver, NEO4J_DATABASE or None)
+    retriever = create_retriever(clients.qdrant, embedding_service, sparse_embedding_service, taxonomy=taxonomy)
+    context_builder = ContextBuilder(embedding_service)
     query_router = get_query_router(
         redis_client=redis_client,
-        embedding_model=embedding_model,
+        embedding_service=embedding_service,
+        retriever=retriever,
+        context_builder=context_builder,
         neo4j_agent=neo4j_agent,
+        clients=clients,
+        semantic_cache=semantic_cache,
+        memory=ConversationMemory(redis_client, database),
+        client_contexts=ClientContextStore(redis_client),
+        llm_monitor=llm_monitor,
         database=database,
         CACHE_TTL_SECONDS=CACHE_TTL_SECONDS)
     app.include_router(query_router, prefix="/api")
+    app.include_router(get_metrics_router(embedding_cache, semantic_cache, context_builder, llm_monitor, neo4j_agent), prefix="/api")
 @app.on_event("shutdown")
 async def shutdown():
     await database.disconnect()
-    neo4j_agent.close()
+    await neo4j_agent.close()
+    await clients.close()
+    await embedding_service.close()
+    if sparse_embedding_service is not None:
+        await sparse_embedding_service.close()
+    await redis_client.aclose()
+    await binary_redis_client.aclose()
 user_router= get_user_router(database)
 history_router=get_user_chats_router(database)
 auth_router = get_auth_router(database)
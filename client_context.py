@@ -0,0 +1,104 @@
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CLIENT_CONTEXT_TTL_SECONDS = int(os.getenv("CLIENT_CONTEXT_TTL_SECONDS", 7 * 24 * 3600))
+# Claim numbers remembered per chat, most recent first
+CLIENT_CONTEXT_MAX_SINISTRES = int(os.getenv("CLIENT_CONTEXT_MAX_SINISTRES", 50))
+
+
+class ClientContext:
+    """
+    The client a chat is about (matricule fiscale or ref_personne) and the claim
+    numbers seen in its answers. Changes made during a request are tracked so
+    ClientContextStore.save can apply just them.
+    """
+
+    def __init__(self, matricule: str | None = None, ref_personne: str | None = None,
+                 sinistres: list[int] | None = None):
+        self.matricule = matricule
+        self.ref_personne = ref_personne
+        self.sinistres = list(sinistres or [])
+        self._client_changed = False
+        self._added: list[int] = []
+
+    def set_client(self, matricule: str | None = None, ref_personne: str | None = None):
+        """Switch to the client named in a question; the claims of the previous one are forgotten."""
+        if (matricule or None) == self.matricule and (ref_personne or None) == self.ref_personne:
+            return
+        if matricule is None and ref_personne is None:
+            return
+        self.matricule, self.ref_personne = matricule, ref_personne
+        self.sinistres, self._added = [], []
+        self._client_changed = True
+
+    def add_sinistres(self, numbers):
+        for number in numbers:
+            if number in self.sinistres:
+                self.sinistres.remove(number)
+            self.sinistres.insert(0, number)
+            self._added.append(number)
+        del self.sinistres[CLIENT_CONTEXT_MAX_SINISTRES:]
+
+    def prompt(self) -> str:
+        """French context lines for the Cypher generation prompt ("" when nothing is known)."""
+        lines = ""
+        if self.matricule:
+            lines += f"L'utilisateur s'est précédemment identifié comme client avec matricule_fiscale = {self.matricule}.\n"
+        elif self.ref_personne:
+            lines += f"L'utilisateur s'est précédemment identifié comme client avec ref_personne = {self.ref_personne}.\n"
+        if self.sinistres:
+            nums = ', '.join(str(n) for n in self.sinistres[:15])
+            lines += f"Les derniers sinistres référencés dans la conversation ont les num_sinistre: {nums}.\n"
+        return lines
+
+
+class ClientContextStore:
+    """
+    ClientContext per user and chat, in Redis: a hash for the client and a sorted
+    set of claim numbers scored by when they were last seen, both expiring after
+    `ttl_seconds` of inactivity. Every worker reads the same context, and no
+    chat ever sees another one's client. `redis_client` must be created with
+    decode_responses=True.
+    """
+
+    def __init__(self, redis_client, ttl_seconds: int = CLIENT_CONTEXT_TTL_SECONDS,
+                 max_sinistres: int = CLIENT_CONTEXT_MAX_SINISTRES):
+        self.redis = redis_client
+        self.ttl_seconds = ttl_seconds
+        self.max_sinistres = max_sinistres
+
+    @staticmethod
+    def _keys(user_id: int, chat_id: int) -> tuple[str, str]:
+        return f"client_ctx:{user_id}:{chat_id}", f"client_ctx:{user_id}:{chat_id}:sinistres"
+
+    async def load(self, user_id: int, chat_id: int | None) -> ClientContext:
+        """The chat's context; an empty one for a new chat."""
+        if not chat_id:
+            return ClientContext()
+        client_key, sinistres_key = self._keys(user_id, chat_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(client_key)
+            pipe.zrevrange(sinistres_key, 0, self.max_sinistres - 1)
+            client, sinistres = await pipe.execute()
+        return ClientContext(client.get("matricule"), client.get("ref_personne"),
+                             [int(n) if n.isdigit() else n for n in sinistres])
+
+    async def save(self, user_id: int, chat_id: int, context: ClientContext):
+        """Apply the changes made to `context` during this request, in one MULTI/EXEC."""
+        client_key, sinistres_key = self._keys(user_id, chat_id)
+        now = time.time()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if context._client_changed:
+                pipe.delete(client_key, sinistres_key)
+                pipe.hset(client_key, mapping={k: v for k, v in (("matricule", context.matricule),
+                                                                 ("ref_personne", context.ref_personne)) if v})
+            if context._added:
+                # Later additions are more recent: score them in order
+                pipe.zadd(sinistres_key, {str(n): now + i * 1e-6 for i, n in enumerate(context._added)})
+                pipe.zremrangebyrank(sinistres_key, 0, -self.max_sinistres - 1)
+            pipe.expire(client_key, self.ttl_seconds)
+            pipe.expire(sinistres_key, self.ttl_seconds)
+            await pipe.execute()
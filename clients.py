@@ -0,0 +1,65 @@
+import os
+import httpx
+from qdrant_client import AsyncQdrantClient
+from dotenv import load_dotenv
+from final_agent import QDRANT_HOST, QDRANT_PORT, NEO4J_URI, NEO4J_USER, create_neo4j_driver
+
+load_dotenv()
+
+# Qdrant: gRPC is served on 6334 next to the REST port
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() in ("1", "true", "yes")
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", 6334))
+
+# Ollama connection pool
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", 20))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", 10))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", 30.0))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", 180.0))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 30.0))
+
+
+class ServiceClients:
+    """
+    Process-wide network clients (Qdrant, Ollama, Neo4j).
+    Opened once in the FastAPI startup hook and closed on shutdown, so every
+    request reuses the same connection pools instead of reconnecting.
+    """
+
+    def __init__(self):
+        self.qdrant: AsyncQdrantClient | None = None
+        self.ollama: httpx.AsyncClient | None = None
+        self.neo4j_driver = None
+
+    async def start(self):
+        self.qdrant = AsyncQdrantClient(
+            host=QDRANT_HOST,
+            port=QDRANT_PORT,
+            grpc_port=QDRANT_GRPC_PORT,
+            prefer_grpc=QDRANT_PREFER_GRPC,
+        )
+        self.ollama = httpx.AsyncClient(
+            timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=OLLAMA_MAX_KEEPALIVE,
+                keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+            ),
+        )
+        try:
+            self.neo4j_driver = create_neo4j_driver()
+            await self.neo4j_driver.verify_connectivity()
+        except Exception as e:
+            raise SystemExit(
+                f"Connection failed to {NEO4J_URI} as {NEO4J_USER}: {e}\n"
+                "Tips: 1) Ensure Neo4j Desktop is running and the database is active. "
+                "2) Verify the URI matches your Neo4j settings. "
+                "3) Check username and password."
+            )
+
+    async def close(self):
+        if self.ollama is not None:
+            await self.ollama.aclose()
+        if self.qdrant is not None:
+            await self.qdrant.close()
+        if self.neo4j_driver is not None:
+            await self.neo4j_driver.close()
@@ -0,0 +1,138 @@
+import os
+import re
+import numpy as np
+from dotenv import load_dotenv
+from text_utils import count_tokens, split_sentences
+
+load_dotenv()
+
+# Prompt budget in (approximate) tokens, template and question included
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 1500))
+# Share of the remaining budget that conversation history may use
+HISTORY_TOKEN_SHARE = float(os.getenv("HISTORY_TOKEN_SHARE", 0.3))
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", 3))
+# Passages sharing this fraction of their word trigrams are considered duplicates
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", 0.8))
+
+def _shingles(text: str, n: int = 3) -> set[tuple[str, ...]]:
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))}
+
+
+def drop_near_duplicates(passages: list[str], threshold: float = DUPLICATE_THRESHOLD) -> list[str]:
+    """Keep passages in rank order, skipping any that mostly repeats an earlier one."""
+    kept, kept_shingles = [], []
+    for passage in passages:
+        sh = _shingles(passage)
+        if any(len(sh & other) / max(min(len(sh), len(other)), 1) >= threshold for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(sh)
+    return kept
+
+
+async def rank_sentences(query_vector: np.ndarray, sentences: list[str], embedding_service) -> np.ndarray:
+    """Cosine similarity of each sentence to the query, computed on one batched embedding pass."""
+    if not sentences:
+        return np.zeros(0, dtype=np.float32)
+    matrix = np.vstack(await embedding_service.embed_many(sentences))
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    query = query_vector / (np.linalg.norm(query_vector) + 1e-12)
+    return matrix @ query
+
+
+class ContextBuilder:
+    """
+    Packs retrieved passages and conversation history into a bounded prompt.
+    Near-duplicate passages are dropped, passages that do not fit are trimmed to
+    the sentences most similar to the query, and history is capped in turns and
+    tokens. Prompt sizes are recorded so their effect can be monitored.
+    """
+
+    def __init__(self, embedding_service, token_budget: int = PROMPT_TOKEN_BUDGET,
+                 history_share: float = HISTORY_TOKEN_SHARE, history_max_turns: int = HISTORY_MAX_TURNS):
+        self.embedding_service = embedding_service
+        self.token_budget = token_budget
+        self.history_share = history_share
+        self.history_max_turns = history_max_turns
+        self._stats = {"requests": 0, "estimated_tokens": 0, "evaluated_tokens": 0, "evaluated_requests": 0,
+                       "max_estimated_tokens": 0, "trimmed_passages": 0, "dropped_duplicates": 0}
+
+    def _history_text(self, history: list[tuple[str, str]], summary: str, budget: int) -> tuple[str, int]:
+        lines: list[str] = []
+        used = 0
+        # Newest turns first, so the most recent exchange survives the cap
+        for q, r in reversed(history[-self.history_max_turns:]):
+            turn = f"Q: {q}\nA: {r}\n"
+            n = count_tokens(turn)
+            if used + n > budget:
+                break
+            lines.insert(0, turn)
+            used += n
+        # The rolling summary of older turns only goes in if the recent turns left room for it
+        if summary and used + count_tokens(summary) <= budget:
+            lines.insert(0, f"Summary of earlier turns:\n{summary}\n")
+            used += count_tokens(summary)
+        if not lines:
+            return "", 0
+        return "Previous conversation:\n" + "".join(lines), used
+
+    async def _trim_passage(self, query_vector: np.ndarray, passage: str, budget: int) -> str:
+        sentences = split_sentences(passage)
+        scores = await rank_sentences(query_vector, sentences, self.embedding_service)
+        keep, used = set(), 0
+        for i in np.argsort(-scores):
+            n = count_tokens(sentences[i])
+            if used + n <= budget:
+                keep.add(int(i))
+                used += n
+        # Original order reads better than similarity order
+        return " ".join(s for i, s in enumerate(sentences) if i in keep)
+
+    async def build(self, query: str, passages: list[str], history: list[tuple[str, str]],
+                    template_tokens: int, summary: str = "") -> tuple[str, str]:
+        """Return (context, history_text) fitting the budget left by the template and the question."""
+        remaining = max(self.token_budget - template_tokens - count_tokens(query), 0)
+        history_text, history_tokens = self._history_text(history, summary, int(remaining * self.history_share))
+        remaining -= history_tokens
+
+        unique = drop_near_duplicates(passages)
+        self._stats["dropped_duplicates"] += len(passages) - len(unique)
+        query_vector = None
+        context_parts: list[str] = []
+        for i, passage in enumerate(unique):
+            # Split what is left evenly over the passages still to place; unused budget rolls forward
+            share = remaining // (len(unique) - i)
+            if share <= 0:
+                break
+            if count_tokens(passage) > share:
+                if query_vector is None:
+                    query_vector = await self.embedding_service.embed(query)
+                passage = await self._trim_passage(query_vector, passage, share)
+                self._stats["trimmed_passages"] += 1
+            if passage:
+                context_parts.append(passage)
+                remaining -= count_tokens(passage)
+        return "\n\n".join(context_parts), history_text
+
+    def record(self, prompt: str, evaluated_tokens: int | None = None) -> int:
+        """Record one prompt's size; `evaluated_tokens` is Ollama's prompt_eval_count when available."""
+        estimated = count_tokens(prompt)
+        self._stats["requests"] += 1
+        self._stats["estimated_tokens"] += estimated
+        self._stats["max_estimated_tokens"] = max(self._stats["max_estimated_tokens"], estimated)
+        if evaluated_tokens is not None:
+            self._stats["evaluated_tokens"] += evaluated_tokens
+            self._stats["evaluated_requests"] += 1
+        print(f"Prompt tokens: ~{estimated} estimated, {evaluated_tokens} evaluated by Ollama")
+        return estimated
+
+    def stats(self) -> dict:
+        requests = self._stats["requests"]
+        evaluated = self._stats["evaluated_requests"]
+        return {
+            **self._stats,
+            "token_budget": self.token_budget,
+            "avg_estimated_tokens": self._stats["estimated_tokens"] / requests if requests else 0.0,
+            "avg_evaluated_tokens": self._stats["evaluated_tokens"] / evaluated if evaluated else 0.0,
+        }
@@ -0,0 +1,104 @@
+import json
+import os
+from databases import Database
+from dotenv import load_dotenv
+from text_utils import count_tokens
+
+load_dotenv()
+
+# Recent turns kept verbatim per chat; older turns are folded into the summary
+CHAT_MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", 6))
+CHAT_MEMORY_SUMMARY_TOKENS = int(os.getenv("CHAT_MEMORY_SUMMARY_TOKENS", 200))
+CHAT_MEMORY_TTL_SECONDS = int(os.getenv("CHAT_MEMORY_TTL_SECONDS", 7 * 24 * 3600))
+
+
+class ConversationMemory:
+    """
+    Per-chat conversation memory kept in Redis: a bounded window of recent
+    (question, answer) turns plus a rolling summary of the turns that fell out
+    of it. A chat missing from Redis (expired, or created before this store
+    existed) is rebuilt lazily from the `conversations` table.
+    """
+
+    def __init__(self, redis_client, database: Database, window: int = CHAT_MEMORY_TURNS,
+                 summary_tokens: int = CHAT_MEMORY_SUMMARY_TOKENS, ttl_seconds: int = CHAT_MEMORY_TTL_SECONDS):
+        self.redis = redis_client
+        self.database = database
+        self.window = window
+        self.summary_tokens = summary_tokens
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _keys(user_id: int, chat_id: int) -> tuple[str, str]:
+        # Scoped by user too, so a foreign chat_id never exposes someone else's turns
+        return f"chat:{user_id}:{chat_id}:turns", f"chat:{user_id}:{chat_id}:summary"
+
+    def _fold(self, summary: str, turns: list[tuple[str, str]]) -> str:
+        """Append evicted turns to the summary, keeping only its most recent lines within budget."""
+        lines = [line for line in summary.split("\n") if line]
+        for q, r in turns:
+            lines.append(f"- {q[:120]} -> {r[:160]}")
+        while lines and count_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    async def _load_from_database(self, user_id: int, chat_id: int) -> tuple[str, list[tuple[str, str]]]:
+        rows = await self.database.fetch_all(
+            query="""
+            SELECT conv.query, conv.response
+            FROM conversations conv
+            JOIN chats c ON c.id = conv.chat_id
+            WHERE conv.chat_id = :chat_id AND c.user_id = :user_id
+            ORDER BY conv.timestamp DESC
+            LIMIT :limit
+            """,
+            values={"chat_id": chat_id, "user_id": user_id, "limit": self.window * 4},
+        )
+        turns = []
+        for row in reversed(rows):
+            try:
+                response = json.loads(row["response"])
+            except (TypeError, ValueError):
+                response = row["response"]
+            turns.append((row["query"], str(response)))
+        return self._fold("", turns[:-self.window]), turns[-self.window:]
+
+    async def load(self, user_id: int, chat_id: int | None) -> tuple[str, list[tuple[str, str]]]:
+        """Return (summary, recent turns) for a chat, oldest turn first."""
+        if not chat_id:
+            return "", []
+        turns_key, summary_key = self._keys(user_id, chat_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.exists(turns_key)
+            pipe.lrange(turns_key, 0, -1)
+            pipe.get(summary_key)
+            exists, raw_turns, summary = await pipe.execute()
+        if exists:
+            return summary or "", [tuple(json.loads(t)) for t in raw_turns]
+
+        summary, turns = await self._load_from_database(user_id, chat_id)
+        if turns:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.rpush(turns_key, *(json.dumps(t, ensure_ascii=False) for t in turns))
+                pipe.set(summary_key, summary)
+                pipe.expire(turns_key, self.ttl_seconds)
+                pipe.expire(summary_key, self.ttl_seconds)
+                await pipe.execute()
+        return summary, turns
+
+    async def append(self, user_id: int, chat_id: int, query: str, answer: str) -> None:
+        """Add a turn already saved in `conversations` to a chat held in Redis."""
+        turns_key, summary_key = self._keys(user_id, chat_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            # Only onto a live list: an expired chat would restart from this turn alone,
+            # while the next load rebuilds it, this turn included, from the database
+            pipe.rpushx(turns_key, json.dumps((query, answer), ensure_ascii=False))
+            pipe.expire(turns_key, self.ttl_seconds)
+            length, _ = await pipe.execute()
+        overflow = length - self.window
+        if overflow <= 0:
+            return
+        evicted = await self.redis.lpop(turns_key, overflow) or []
+        summary = await self.redis.get(summary_key) or ""
+        summary = self._fold(summary, [tuple(json.loads(t)) for t in evicted])
+        await self.redis.set(summary_key, summary, ex=self.ttl_seconds)
@@ -0,0 +1,125 @@
+import os
+import re
+import json
+import hashlib
+import time
+from dotenv import load_dotenv
+from embedding_cache import normalize_text
+
+load_dotenv()
+
+CYPHER_CACHE_MAX_ENTRIES = int(os.getenv("CYPHER_CACHE_MAX_ENTRIES", 500))
+CYPHER_CACHE_TTL_SECONDS = int(os.getenv("CYPHER_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+# Sorted set of cached shape keys scored by last use, for LRU eviction
+SHAPES_KEY = "cypher:shapes"
+
+QUOTE = "'\"‘’«»"
+# Quoted labels ('DEGATS DES EAUX'), then any token holding a digit (44849, 0000716X).
+# A quote must open after a space so the apostrophes of "l’état" or "d'assurance" are not taken for one.
+ENTITY_RE = re.compile(rf"(?:(?<=\s)|^)[{QUOTE}]([^{QUOTE}]+?)[{QUOTE}](?=[\s?.,;:!)]|$)|\b(\w*\d\w*)\b")
+# Literals left in a parameterized query that did not come from the question
+# (e.g. a matricule taken from the conversation context) make it unsafe to share
+FOREIGN_LITERAL_RE = re.compile(r"'[^']*'|\"[^\"]*\"|(?<![\w.$])\d{4,}(?![\w.])")
+# Row counts of the query itself (e.g. the LIMIT 100 _sanitize_cypher adds), never question entities
+PAGING_RE = re.compile(r"(\b(?:LIMIT|SKIP)\s+\d+)", re.IGNORECASE)
+
+
+def question_shape(question: str) -> tuple[str, list]:
+    """Question with its entities replaced by placeholders, and the entities in order."""
+    entities: list = []
+
+    def placeholder(m: re.Match) -> str:
+        if m.group(1) is not None:
+            entities.append(m.group(1).strip())
+            return " <label> "
+        token = m.group(2)
+        entities.append(int(token) if token.isdigit() else token)
+        return " <num> " if token.isdigit() else " <code> "
+
+    return normalize_text(ENTITY_RE.sub(placeholder, question)), entities
+
+
+def parameterize(cypher: str, entities: list) -> str | None:
+    """Replace the question's entities in a generated query by $p0, $p1...; None if the query cannot be shared."""
+    # LIMIT/SKIP counts are never parameterized ("client 100" must not turn "LIMIT 100" into
+    # "LIMIT $p0"); one equal to a question number may come from it ("les 5 derniers"): no sharing
+    parts = PAGING_RE.split(cypher)
+    counts = {int(part.split()[-1]) for part in parts[1::2]}
+    if any(isinstance(value, int) and value in counts for value in entities):
+        return None
+    for i, value in enumerate(entities):
+        for j in range(0, len(parts), 2):
+            if isinstance(value, int):
+                parts[j] = re.sub(rf"(?<![\w.$]){value}(?![\w.])", f"$p{i}", parts[j])
+            else:
+                parts[j] = parts[j].replace(f"'{value}'", f"$p{i}").replace(f'"{value}"', f"$p{i}")
+    if any(FOREIGN_LITERAL_RE.search(part) for part in parts[::2]):
+        return None
+    return "".join(parts)
+
+
+class CypherCache:
+    """
+    Cypher that executed successfully, keyed on the entity-normalized question shape,
+    so "sinistres du client 44849" and "sinistres du client 1183" share one query
+    and differ only in their parameters. Entries live in Redis with a TTL refreshed
+    on use; past `max_entries` the least recently used shapes are evicted.
+    """
+
+    def __init__(self, redis_client, max_entries: int = CYPHER_CACHE_MAX_ENTRIES,
+                 ttl_seconds: int = CYPHER_CACHE_TTL_SECONDS):
+        self.redis = redis_client
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "rejected": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(shape: str) -> str:
+        return f"cypher:shape:{hashlib.sha1(shape.encode('utf-8')).hexdigest()}"
+
+    async def lookup(self, question: str) -> tuple[str, dict] | None:
+        """(cypher, parameters) for a known question shape, or None."""
+        shape, entities = question_shape(question)
+        key = self._key(shape)
+        raw = await self.redis.get(key)
+        if raw is None:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        entry = json.loads(raw)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.expire(key, self.ttl_seconds)
+            pipe.zadd(SHAPES_KEY, {key: time.time()})
+            await pipe.execute()
+        params = {f"p{i}": value for i, value in enumerate(entities) if f"$p{i}" in entry["cypher"]}
+        return entry["cypher"], params
+
+    async def store(self, question: str, cypher: str):
+        """Remember a query that executed without error for this question's shape."""
+        shape, entities = question_shape(question)
+        parameterized = parameterize(cypher, entities)
+        if parameterized is None:
+            self._stats["rejected"] += 1
+            return
+        key = self._key(shape)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, json.dumps({"shape": shape, "cypher": parameterized}, ensure_ascii=False), ex=self.ttl_seconds)
+            pipe.zadd(SHAPES_KEY, {key: time.time()})
+            pipe.zcard(SHAPES_KEY)
+            *_, size = await pipe.execute()
+        self._stats["stores"] += 1
+        if size > self.max_entries:
+            evicted = await self.redis.zpopmin(SHAPES_KEY, size - self.max_entries)
+            if evicted:
+                await self.redis.delete(*(k for k, _ in evicted))
+                self._stats["evictions"] += len(evicted)
+
+    async def evict(self, question: str):
+        """Drop a shape whose cached query failed, so the next ask regenerates it."""
+        key = self._key(question_shape(question)[0])
+        await self.redis.delete(key)
+        await self.redis.zrem(SHAPES_KEY, key)
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {**self._stats, "hit_rate": self._stats["hits"] / lookups if lookups else 0.0}
@@ -0,0 +1,305 @@
+import re
+from embedding_cache import normalize_text
+
+# -----------------------------
+# Parameter extraction
+# -----------------------------
+
+# Run on normalize_text() output: lower case, no accents
+NUMBER_PARAMS = {
+    "num_sinistre": re.compile(r"sinistre\s*(?:numero|num|n°|no)?\s*:?\s*(\d{6,})"),
+    "num_contrat": re.compile(r"contrat\s*(?:numero|num|n°|no)?\s*:?\s*(\d{6,})"),
+    "ref_personne": re.compile(r"(?:ref[_ ]?personne|client)\s*(?:est|=|:|numero|n°)?\s*(\d+)"),
+    "capital_min": re.compile(r"(?:superieur|plus)\s*(?:a|de|que)?\s*(\d+(?:[.,]\d+)?)"),
+}
+MATRICULE_RE = re.compile(r"matri\w*\s*fiscale?\s*(?:est|=|:)?\s*([a-z0-9]+)")
+# Run on the original text: labels are matched case-insensitively but keep their spelling
+QUOTE = "'\"‘’«»"
+LABEL_PARAMS = {
+    "lib_garantie": re.compile(rf"(?:garantie|couverture pour|couvert par)\s*[{QUOTE}]\s*([^{QUOTE}]+?)\s*[{QUOTE}]", re.IGNORECASE),
+    "lib_produit": re.compile(rf"produit\s*[{QUOTE}]\s*([^{QUOTE}]+?)\s*[{QUOTE}]", re.IGNORECASE),
+}
+# The client identifiers are consumed by every template: the routes append the chat's
+# current client to each question ("(ref_personne est 1183)")
+CLIENT_PARAMS = ("ref_personne", "matricule_fiscale")
+
+# Client lookup fragments, chosen by the identifier found in the question
+CLIENT_BY_REF = "(p:PersonnePhysique|PersonneMorale {ref_personne: $ref_personne})"
+CLIENT_BY_MATRICULE = "(p:PersonneMorale {matricule_fiscale: $matricule_fiscale})"
+
+WORD_RE = re.compile(r"[a-z0-9_]+")
+# Words any template accepts. Everything else left in a question once its parameters
+# are taken out must be in the template's vocabulary: qualifiers no template
+# handles (years, "combien", "plus recent", "actif", "avant"...) send it to the LLM.
+COMMON_WORDS = re.compile(
+    r"le|la|les|l|un|une|des|de|du|d|au|aux|a|est|sont|ont|ayant|et|il|elle|ils|elles|t|y|en|ce|cette|ces"
+    r"|son|sa|ses|leur|leurs|mon|ma|mes|notre|nos|votre|vos|quel|quels|quelle|quelles|qui|que|qu|pour|avec"
+    r"|par|dans|sur|je|me|moi|nous|donne|donnez|donner|affiche|afficher|montre|montrer|liste|lister|indique"
+    r"|indiquer|voir|veux|voudrais|savoir|peux|pouvez|svp|stp|tous|toutes|numero|num|n|no|ref_personne|ref"
+    r"|personne|matricule|fiscale|client|clients"
+)
+
+
+def _extract(question: str) -> tuple[dict, list[tuple[str, tuple[int, int]]], str]:
+    """Parameters, the span of each one in the normalized text, and that text with labels blanked."""
+    # Labels are blanked before normalizing, so a quoted label never leaves words behind
+    for pattern in LABEL_PARAMS.values():
+        question = pattern.sub(lambda m: m.group(0).replace(m.group(1), " " * len(m.group(1))), question)
+    text = normalize_text(question)
+    params: dict = {}
+    spans: list[tuple[str, tuple[int, int]]] = []
+    for name, pattern in NUMBER_PARAMS.items():
+        m = pattern.search(text)
+        if m is None:
+            params[name] = None
+            continue
+        params[name] = float(m.group(1).replace(",", ".")) if name == "capital_min" else int(m.group(1))
+        spans.append((name, m.span(1)))
+    m = MATRICULE_RE.search(text)
+    params["matricule_fiscale"] = m.group(1).upper() if m else None
+    if m:
+        spans.append(("matricule_fiscale", m.span(1)))
+    return params, spans, text
+
+
+def extract_params(question: str) -> dict:
+    """Identifiers and labels mentioned in a client question (missing ones are None)."""
+    params = _extract(question)[0]
+    for name, pattern in LABEL_PARAMS.items():
+        m = pattern.search(question)
+        params[name] = m.group(1).strip() if m else None
+    return params
+
+
+def remaining_words(text: str, spans: list[tuple[str, tuple[int, int]]], used: set[str]) -> list[str]:
+    """Words of `text` left once the spans of the used parameters are cut out, minus the common words."""
+    for name, (start, end) in sorted(spans, key=lambda s: s[1], reverse=True):
+        if name in used or name in CLIENT_PARAMS:
+            text = text[:start] + " " + text[end:]
+    return [w for w in WORD_RE.findall(text) if not COMMON_WORDS.fullmatch(w)]
+
+# -----------------------------
+# Templates
+# -----------------------------
+
+class CypherTemplate:
+    """
+    A known question shape: an intent pattern over the normalized question, the
+    vocabulary its words must come from, the parameters it needs, and a fixed
+    parameterized query. A question matches only when the template accounts for
+    all of it: any word or number outside its parameters, the common words and
+    its vocabulary is a qualifier the query would silently drop. `{client}` in the
+    query is replaced by the lookup matching the client identifier found.
+    """
+
+    def __init__(self, name: str, intent: str, vocabulary: str, required: tuple[str, ...], cypher: str):
+        self.name = name
+        self.intent = re.compile(intent)
+        self.vocabulary = re.compile(vocabulary)
+        self.required = required
+        self.cypher = cypher.strip()
+
+    def render(self, question: str, params: dict, spans: list | None = None,
+               text: str | None = None) -> tuple[str, dict] | None:
+        if spans is None or text is None:
+            _, spans, text = _extract(question)
+        if not self.intent.search(text):
+            return None
+        cypher = self.cypher
+        if "{client}" in cypher:
+            if params["ref_personne"] is not None:
+                cypher = cypher.replace("{client}", CLIENT_BY_REF)
+            elif params["matricule_fiscale"] is not None:
+                cypher = cypher.replace("{client}", CLIENT_BY_MATRICULE)
+            else:
+                return None
+        if any(params[name] is None for name in self.required):
+            return None
+        names = set(re.findall(r"\$(\w+)", cypher))
+        # A label the query does not use would be a silently dropped filter
+        if any(params[name] is not None and name not in names for name in LABEL_PARAMS):
+            return None
+        if any(not self.vocabulary.fullmatch(w) for w in remaining_words(text, spans, names)):
+            return None
+        return cypher, {name: params[name] for name in names}
+
+
+# Vocabulary fragments shared by the templates
+SINISTRE = r"sinistres?"
+CONTRAT = r"contrats?"
+GARANTIE = r"garanties?|couverts?|couvertes?|couverture|couvre|couvrant|couvrent"
+CAPITAL = r"capital|capitaux|assures?"
+ASSOCIE = r"associes?|associee?s?|lies?|liee?s?|inclus|incluses?|souscrits?|souscrites?"
+STATUT = r"statut|statuts|etat|etats"
+
+
+def _vocabulary(*fragments: str) -> str:
+    return "|".join(fragments)
+
+# Most specific shapes first: the first template that renders wins
+TEMPLATES = [
+    CypherTemplate(
+        "sinistre_couvert_par_garantie", r"couver",
+        _vocabulary(SINISTRE, GARANTIE, CONTRAT, ASSOCIE),
+        ("num_sinistre", "lib_garantie"),
+        """
+        MATCH (s:Sinistre {num_sinistre: $num_sinistre})-[:CONCERNE]->(c:Contrat)
+        OPTIONAL MATCH (c)-[r:INCLUT]->(g:Garantie)
+        WHERE toUpper(g.lib_garantie) = toUpper($lib_garantie)
+        RETURN s.num_sinistre AS num_sinistre, c.num_contrat AS num_contrat, $lib_garantie AS garantie,
+               g IS NOT NULL AS couvert, r.capital_assure AS capital_assure
+        """,
+    ),
+    CypherTemplate(
+        "sinistre_garanties_capital_min", r"capital",
+        _vocabulary(SINISTRE, GARANTIE, CAPITAL, CONTRAT, ASSOCIE, r"superieurs?|superieures?|plus"),
+        ("num_sinistre", "capital_min"),
+        """
+        MATCH (s:Sinistre {num_sinistre: $num_sinistre})-[:CONCERNE]->(c:Contrat)-[r:INCLUT]->(g:Garantie)
+        WHERE r.capital_assure > $capital_min
+        RETURN c.num_contrat AS num_contrat, g.lib_garantie AS garantie, r.capital_assure AS capital_assure
+        ORDER BY capital_assure DESC
+        """,
+    ),
+    CypherTemplate(
+        "sinistre_garanties_descriptions", r"description",
+        _vocabulary(SINISTRE, GARANTIE, CONTRAT, ASSOCIE, r"descriptions?"),
+        ("num_sinistre",),
+        """
+        MATCH (s:Sinistre {num_sinistre: $num_sinistre})-[:CONCERNE]->(c:Contrat)-[r:INCLUT]->(g:Garantie)
+        RETURN c.num_contrat AS num_contrat, g.lib_garantie AS garantie, g.description AS description,
+               r.capital_assure AS capital_assure
+        """,
+    ),
+    CypherTemplate(
+        "sinistre_couverture", r"couver|garantie",
+        _vocabulary(SINISTRE, GARANTIE, CAPITAL, CONTRAT, ASSOCIE),
+        ("num_sinistre",),
+        """
+        MATCH (s:Sinistre {num_sinistre: $num_sinistre})-[:CONCERNE]->(c:Contrat)-[r:INCLUT]->(g:Garantie)
+        RETURN c.num_contrat AS num_contrat, c.lib_produit AS produit, g.lib_garantie AS garantie,
+               r.capital_assure AS capital_assure
+        """,
+    ),
+    CypherTemplate(
+        "sinistre_client", r"quel(?:le)? est le client|a qui|titulaire",
+        _vocabulary(SINISTRE, CONTRAT, ASSOCIE, r"titulaire|appartient|concerne"),
+        ("num_sinistre",),
+        """
+        MATCH (s:Sinistre {num_sinistre: $num_sinistre})-[:CONCERNE]->(c:Contrat)<-[:A_SOUSCRIT]-(p)
+        RETURN s.num_sinistre AS num_sinistre, c.num_contrat AS num_contrat, p.ref_personne AS ref_personne,
+               coalesce(p.nom_prenom, p.raison_sociale) AS client
+        """,
+    ),
+    CypherTemplate(
+        "sinistre_statut", r"statut|etat|ou en est",
+        _vocabulary(SINISTRE, STATUT, CONTRAT, ASSOCIE, r"ou"),
+        ("num_sinistre",),
+        """
+        MATCH (s:Sinistre {num_sinistre: $num_sinistre})
+        OPTIONAL MATCH (s)-[:CONCERNE]->(c:Contrat)
+        RETURN s.num_sinistre AS num_sinistre, s.lib_etat_sinistre AS etat, s.lib_type_sinistre AS type,
+               s.date_survenance AS date_survenance, s.date_declaration AS date_declaration,
+               c.num_contrat AS num_contrat
+        """,
+    ),
+    CypherTemplate(
+        "contrat_garanties", r"garantie|capital|couver",
+        _vocabulary(CONTRAT, GARANTIE, CAPITAL, ASSOCIE),
+        ("num_contrat",),
+        """
+        MATCH (c:Contrat {num_contrat: $num_contrat})-[r:INCLUT]->(g:Garantie)
+        RETURN c.num_contrat AS num_contrat, g.lib_garantie AS garantie, r.capital_assure AS capital_assure
+        ORDER BY capital_assure DESC
+        """,
+    ),
+    CypherTemplate(
+        "contrat_details", r"statut|etat|paiement|expir|echeance|terme|contrat",
+        _vocabulary(CONTRAT, STATUT, CAPITAL,
+                    r"paiement|produit|expiration|expire|echeance|prochain|terme|date|effet|details|informations|quand"),
+        ("num_contrat",),
+        """
+        MATCH (c:Contrat {num_contrat: $num_contrat})
+        RETURN c.num_contrat AS num_contrat, c.lib_produit AS produit, c.lib_etat_contrat AS etat,
+               c.statut_paiement AS statut_paiement, c.effet_contrat AS effet_contrat,
+               c.date_expiration AS date_expiration, c.prochain_terme AS prochain_terme,
+               c.capital_assure AS capital_assure
+        """,
+    ),
+    CypherTemplate(
+        "client_contrats_garantie_paiement", r"contrat|paiement",
+        _vocabulary(CONTRAT, GARANTIE, STATUT, ASSOCIE, r"paiement"),
+        ("lib_garantie",),
+        """
+        MATCH {client}-[:A_SOUSCRIT]->(c:Contrat)-[r:INCLUT]->(g:Garantie)
+        WHERE toUpper(g.lib_garantie) = toUpper($lib_garantie)
+        RETURN c.num_contrat AS num_contrat, c.lib_produit AS produit, c.statut_paiement AS statut_paiement,
+               r.capital_assure AS capital_assure
+        """,
+    ),
+    CypherTemplate(
+        "client_paiement", r"paiement",
+        _vocabulary(CONTRAT, STATUT, ASSOCIE, r"paiement|produit"),
+        (),
+        """
+        MATCH {client}-[:A_SOUSCRIT]->(c:Contrat)
+        WHERE $lib_produit IS NULL OR toUpper(c.lib_produit) = toUpper($lib_produit)
+        RETURN c.num_contrat AS num_contrat, c.lib_produit AS produit, c.statut_paiement AS statut_paiement,
+               c.somme_quittances AS somme_quittances
+        """,
+    ),
+    CypherTemplate(
+        "client_garanties_capital_non_nul", r"garantie.*capital.*(?:non nul|> ?0|positif)",
+        _vocabulary(GARANTIE, CAPITAL, CONTRAT, ASSOCIE, r"non|nul|positif"),
+        (),
+        """
+        MATCH {client}-[:A_SOUSCRIT]->(c:Contrat)-[r:INCLUT]->(g:Garantie)
+        WHERE r.capital_assure > 0
+        RETURN DISTINCT c.num_contrat AS num_contrat, g.lib_garantie AS garantie, r.capital_assure AS capital_assure
+        """,
+    ),
+    CypherTemplate(
+        "client_garanties", r"garantie",
+        _vocabulary(GARANTIE, CAPITAL, CONTRAT, ASSOCIE, r"descriptions?"),
+        (),
+        """
+        MATCH {client}-[:A_SOUSCRIT]->(c:Contrat)-[r:INCLUT]->(g:Garantie)
+        RETURN DISTINCT c.num_contrat AS num_contrat, g.lib_garantie AS garantie, g.description AS description,
+               r.capital_assure AS capital_assure
+        """,
+    ),
+    CypherTemplate(
+        "client_sinistres", r"sini\w*tre",
+        _vocabulary(SINISTRE, STATUT, CONTRAT, ASSOCIE, r"declares?|declarees?"),
+        (),
+        """
+        MATCH {client}-[:A_SOUSCRIT]->(c:Contrat)<-[:CONCERNE]-(s:Sinistre)
+        RETURN DISTINCT s.num_sinistre AS num_sinistre, s.lib_etat_sinistre AS etat, s.lib_type_sinistre AS type,
+               s.date_survenance AS date_survenance, c.num_contrat AS num_contrat
+        ORDER BY date_survenance DESC
+        LIMIT 100
+        """,
+    ),
+    CypherTemplate(
+        "client_contrats", r"contrat",
+        _vocabulary(CONTRAT, STATUT, ASSOCIE, r"produits?"),
+        (),
+        """
+        MATCH {client}-[:A_SOUSCRIT]->(c:Contrat)
+        RETURN c.num_contrat AS num_contrat, c.lib_produit AS produit, c.lib_etat_contrat AS etat,
+               c.statut_paiement AS statut_paiement, c.date_expiration AS date_expiration
+        LIMIT 100
+        """,
+    ),
+]
+
+
+def match_template(question: str, templates: list[CypherTemplate] = TEMPLATES) -> tuple[str, str, dict] | None:
+    """(template name, cypher, parameters) for a known question shape, or None to fall back to the LLM."""
+    params = extract_params(question)
+    _, spans, text = _extract(question)
+    for template in templates:
+        rendered = template.render(question, params, spans, text)
+        if rendered is not None:
+            return (template.name, *rendered)
+    return None
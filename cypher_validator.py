@@ -0,0 +1,125 @@
+import os
+import re
+import time
+import difflib
+from dotenv import load_dotenv
+from neo4j.exceptions import ClientError
+
+load_dotenv()
+
+# The graph schema only changes when the KG scripts run
+SCHEMA_TTL_SECONDS = int(os.getenv("CYPHER_SCHEMA_TTL_SECONDS", 3600))
+
+STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+COMMENT_RE = re.compile(r"//[^\n]*")
+NODE_RE = re.compile(r"\(\s*(\w*)\s*((?::\s*`?\w+`?\s*(?:[|&:]\s*`?\w+`?\s*)*)?)\s*(\{[^{}]*\})?\s*\)")
+REL_RE = re.compile(r"\[\s*(\w*)\s*(?::\s*([`\w|:&!\s]+?))?\s*(?:\*[\d.]*)?\s*(\{[^{}]*\})?\s*\]")
+NAME_RE = re.compile(r"`?(\w+)`?")
+MAP_KEY_RE = re.compile(r"(\w+)\s*:")
+PROPERTY_RE = re.compile(r"\b([A-Za-z_]\w*)\.(\w+)\b")
+
+
+def _closest(name: str, known) -> str:
+    # Near spellings first, then names containing it ("etat" -> lib_etat_sinistre)
+    matches = difflib.get_close_matches(name, list(known), n=3, cutoff=0.5)
+    matches += sorted(k for k in known if name.lower() in k.lower() and k not in matches)[:3 - len(matches)]
+    return f" (did you mean: {', '.join(matches)}?)" if matches else ""
+
+
+class CypherValidator:
+    """
+    Checks LLM-generated Cypher before it runs: labels, relationship types and
+    properties against the graph schema (introspected once, then cached), and an
+    EXPLAIN to catch syntax and semantic errors without touching the data.
+    `validate` returns human-readable problems, precise enough for a repair prompt.
+    """
+
+    def __init__(self, driver, database: str | None = None, ttl_seconds: int = SCHEMA_TTL_SECONDS):
+        self.driver = driver
+        self.database = database
+        self.ttl_seconds = ttl_seconds
+        self._schema: dict | None = None
+        self._loaded_at = 0.0
+
+    async def schema(self) -> dict:
+        if self._schema is not None and time.monotonic() - self._loaded_at < self.ttl_seconds:
+            return self._schema
+        node_props: dict[str, set[str]] = {}
+        rel_props: dict[str, set[str]] = {}
+        async with self.driver.session(database=self.database) as session:
+            for record in await (await session.run("CALL db.labels() YIELD label RETURN label")).data():
+                node_props.setdefault(record["label"], set())
+            for record in await (await session.run(
+                    "CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType")).data():
+                rel_props.setdefault(record["relationshipType"], set())
+            for record in await (await session.run(
+                    "CALL db.schema.nodeTypeProperties() YIELD nodeLabels, propertyName "
+                    "RETURN nodeLabels, propertyName")).data():
+                for label in record["nodeLabels"]:
+                    if record["propertyName"]:
+                        node_props.setdefault(label, set()).add(record["propertyName"])
+            for record in await (await session.run(
+                    "CALL db.schema.relTypeProperties() YIELD relType, propertyName "
+                    "RETURN relType, propertyName")).data():
+                rel_type = record["relType"].strip(":`")
+                if record["propertyName"]:
+                    rel_props.setdefault(rel_type, set()).add(record["propertyName"])
+        self._schema = {"labels": node_props, "relationships": rel_props}
+        self._loaded_at = time.monotonic()
+        return self._schema
+
+    def check_schema(self, cypher: str, schema: dict) -> list[str]:
+        """Schema problems of a query, found by a light parse of its patterns and property accesses."""
+        text = COMMENT_RE.sub("", STRING_RE.sub("''", cypher))
+        labels, relationships = schema["labels"], schema["relationships"]
+        problems: list[str] = []
+        bound: dict[str, tuple[dict, set[str]]] = {}
+
+        def bind(var: str, kinds: dict, names: list[str], props: str | None, what: str):
+            known = [n for n in names if n in kinds]
+            for name in names:
+                if name not in kinds:
+                    problems.append(f"Unknown {what} :{name}{_closest(name, kinds)}")
+            if var and known:
+                bound.setdefault(var, (kinds, set()))[1].update(known)
+            for key in MAP_KEY_RE.findall(props or ""):
+                if known and not any(key in kinds[n] for n in known):
+                    problems.append(f"Property '{key}' does not exist on :{'|'.join(known)}"
+                                    f"{_closest(key, set().union(*(kinds[n] for n in known)))}")
+
+        for var, label_text, props in NODE_RE.findall(text):
+            bind(var, labels, NAME_RE.findall(label_text), props, "label")
+        for var, type_text, props in REL_RE.findall(text):
+            bind(var, relationships, NAME_RE.findall(type_text or ""), props, "relationship type")
+
+        for var, prop in set(PROPERTY_RE.findall(text)):
+            if var not in bound:
+                continue
+            kinds, names = bound[var]
+            if not any(prop in kinds[n] for n in names):
+                problems.append(f"Property '{prop}' does not exist on {var}:{'|'.join(sorted(names))}"
+                                f"{_closest(prop, set().union(*(kinds[n] for n in names)))}")
+        return sorted(set(problems))
+
+    async def explain(self, cypher: str) -> str | None:
+        """Compile the query without running it; the error message, or None if it plans."""
+        try:
+            async with self.driver.session(database=self.database) as session:
+                result = await session.run(f"EXPLAIN {cypher}")
+                await result.consume()
+        except ClientError as e:
+            # Syntax and semantic errors; connection or timeout failures are not the query's fault
+            return str(e)
+        return None
+
+    async def validate(self, cypher: str) -> list[str]:
+        try:
+            problems = self.check_schema(cypher, await self.schema())
+        except Exception as e:
+            # Schema introspection unavailable: EXPLAIN alone still catches the worst
+            print(f"Cypher schema check skipped: {e}")
+            problems = []
+        if problems:
+            return problems
+        error = await self.explain(cypher)
+        return [error] if error else []
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import time
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBED_CACHE_LRU_SIZE = int(os.getenv("EMBED_CACHE_LRU_SIZE", 2048))
+EMBED_CACHE_TTL_SECONDS = int(os.getenv("EMBED_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+
+def normalize_text(text: str) -> str:
+    """Fold case, accents and whitespace so trivially different phrasings share one key."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache of query embeddings: a bounded in-process LRU in front of Redis.
+    Vectors are stored in Redis as raw float32 bytes. Keys are namespaced by the
+    embedding model name, so switching models never serves stale vectors.
+    `redis_client` must be created with decode_responses=False.
+    """
+
+    def __init__(self, redis_client, model_name: str, lru_size: int = EMBED_CACHE_LRU_SIZE,
+                 ttl_seconds: int = EMBED_CACHE_TTL_SECONDS):
+        self.redis = redis_client
+        self.model_name = model_name
+        self.lru_size = lru_size
+        self.ttl_seconds = ttl_seconds
+        self._lru: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._stats = {
+            "lru_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "lookup_seconds": 0.0,
+            "lookups": 0,
+            "embed_seconds": 0.0,
+        }
+
+    def _redis_key(self, normalized: str) -> str:
+        digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        return f"emb:{self.model_name}:{digest}"
+
+    def _remember(self, normalized: str, vector: np.ndarray):
+        self._lru[normalized] = vector
+        self._lru.move_to_end(normalized)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    async def get(self, text: str) -> np.ndarray | None:
+        start = time.perf_counter()
+        normalized = normalize_text(text)
+        try:
+            vector = self._lru.get(normalized)
+            if vector is not None:
+                self._lru.move_to_end(normalized)
+                self._stats["lru_hits"] += 1
+                return vector
+            try:
+                raw = await self.redis.get(self._redis_key(normalized))
+            except Exception as e:
+                print(f"Embedding cache lookup failed: {e}")
+                raw = None
+            if raw:
+                vector = np.frombuffer(raw, dtype=np.float32)
+                self._remember(normalized, vector)
+                self._stats["redis_hits"] += 1
+                return vector
+            self._stats["misses"] += 1
+            return None
+        finally:
+            self._stats["lookups"] += 1
+            self._stats["lookup_seconds"] += time.perf_counter() - start
+
+    async def put(self, text: str, vector) -> None:
+        normalized = normalize_text(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        self._remember(normalized, vector)
+        try:
+            await self.redis.set(self._redis_key(normalized), vector.tobytes(), ex=self.ttl_seconds)
+        except Exception as e:
+            print(f"Embedding cache write failed: {e}")
+
+    def record_embed(self, seconds: float):
+        """Time spent computing an embedding after a miss."""
+        self._stats["embed_seconds"] += seconds
+
+    def stats(self) -> dict:
+        lookups = self._stats["lookups"]
+        hits = self._stats["lru_hits"] + self._stats["redis_hits"]
+        return {
+            "model": self.model_name,
+            "lru_size": len(self._lru),
+            "lru_capacity": self.lru_size,
+            "lru_hits": self._stats["lru_hits"],
+            "redis_hits": self._stats["redis_hits"],
+            "misses": self._stats["misses"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "avg_lookup_ms": 1000 * self._stats["lookup_seconds"] / lookups if lookups else 0.0,
+            "avg_miss_embed_ms": 1000 * self._stats["embed_seconds"] / self._stats["misses"] if self._stats["misses"] else 0.0,
+        }
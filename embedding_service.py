@@ -0,0 +1,103 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Micro-batching window: a batch is flushed after EMBED_MAX_WAIT_MS or EMBED_MAX_BATCH items
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", 32))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", 5))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", 1))
+
+
+class EmbeddingService:
+    """
+    Async front for a fastembed model.
+    Inference runs in a thread pool so the event loop never blocks on ONNX, and
+    texts submitted concurrently by different requests are embedded together
+    in one batch. `method` selects the model entry point, e.g. "query_embed"
+    for sparse BM25 queries.
+    """
+
+    def __init__(self, model, max_batch_size: int = EMBED_MAX_BATCH, max_wait_ms: float = EMBED_MAX_WAIT_MS,
+                 workers: int = EMBED_WORKERS, cache=None, method: str = "embed"):
+        self.model = model
+        self._embed_fn = getattr(model, method)
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embedding")
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._collect_batches())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def embed(self, text: str, use_cache: bool = True):
+        """
+        Embed one text; waits for the batch it lands in.
+        Query texts go through the EmbeddingCache when one is configured.
+        """
+        if use_cache and self.cache is not None:
+            vector = await self.cache.get(text)
+            if vector is not None:
+                return vector
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        vector = await future
+        if use_cache and self.cache is not None:
+            self.cache.record_embed(time.perf_counter() - start)
+            await self.cache.put(text, vector)
+        return vector
+
+    async def embed_many(self, texts: list[str], use_cache: bool = False) -> list[np.ndarray]:
+        return list(await asyncio.gather(*(self.embed(t, use_cache=use_cache) for t in texts)))
+
+    # ---------------- Batching -----------------
+    def _embed_batch(self, texts: list[str]) -> list[np.ndarray]:
+        return list(self._embed_fn(texts, batch_size=len(texts)))
+
+    async def _collect_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Hand the batch to the pool and go straight back to collecting the next one
+            texts = [text for text, _ in batch]
+            futures = [future for _, future in batch]
+            job = loop.run_in_executor(self._executor, self._embed_batch, texts)
+            job.add_done_callback(lambda done, futures=futures: self._resolve(done, futures))
+
+    @staticmethod
+    def _resolve(done: asyncio.Future, futures: list[asyncio.Future]):
+        error = done.exception()
+        vectors = None if error else done.result()
+        for i, future in enumerate(futures):
+            if future.done():  # caller went away (e.g. client disconnected)
+                continue
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(vectors[i])
@@ -1,15 +1,24 @@
 from datetime import datetime, timezone
+import asyncio
 import numpy as np
-from qdrant_client import QdrantClient
 import httpx
 from fastembed import TextEmbedding
-from neo4j import GraphDatabase
+from neo4j import AsyncGraphDatabase, READ_ACCESS, unit_of_work
 from openai import OpenAI
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator
+import json
 import re 
 import requests
 import os 
+from context_builder import drop_near_duplicates, rank_sentences
+from text_utils import count_tokens, split_sentences, clean_content
+from cypher_templates import match_template
+from cypher_validator import CypherValidator
+from agent_memory import MemoryIndex, MemoryLog, AGENT_MEMORY_MAX, MEMORY_EMBED_BATCH
+from client_context import ClientContext
+from result_formatter import format_records, RESULT_LLM_MAX_ROWS
+from llm_monitor import LLMLoadMonitor
 from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import cm
@@ -19,8 +28,10 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 load_dotenv()
 
 # Configuration for FAISS (Part 1: Product Comprehension)
-FAISS_INDEX_FILE = "process_PDF/embeddings.index"
-METADATA_FILE = "process_PDF/metadata.json"
+# In-process index exported from Qdrant by process_PDF/export_local_index.py (see retrieval.py)
+FAISS_INDEX_FILE = os.getenv("FAISS_INDEX_FILE", "process_PDF/embeddings.index")
+VECTORS_FILE = os.getenv("VECTORS_FILE", "process_PDF/embeddings.npy")
+METADATA_FILE = os.getenv("METADATA_FILE", "process_PDF/metadata.jsonl")
 
 
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
@@ -30,15 +41,29 @@ QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "pdf_embeddings")
 # Ollama configuration
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama:11434")
 
+# Extractive answers (no LLM): sentences kept, and the similarity a sentence needs to be quoted
+EXTRACTIVE_MAX_SENTENCES = int(os.getenv("EXTRACTIVE_MAX_SENTENCES", 3))
+EXTRACTIVE_MIN_SCORE = float(os.getenv("EXTRACTIVE_MIN_SCORE", 0.3))
+
 # Configuration for Neo4j Agent (Part 2: Client Data Analysis)
 NEO4J_URI = os.getenv("NEO4J_URI", "")
 NEO4J_USER = os.getenv("NEO4J_USER", "")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD", "")
 NEO4J_DATABASE = os.getenv("NEO4J_DATABASE", "")
+# Async driver pool of each worker, and the server-side limit of one read transaction
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", 50))
+NEO4J_ACQUISITION_TIMEOUT = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", 10.0))
+NEO4J_TX_TIMEOUT = float(os.getenv("NEO4J_TX_TIMEOUT", 30.0))
+
 
-# Persistent conversation memory for FAISS (Product) Agent
-conversation_history = []
-CONVERSATION_FILE = "conversation_history.json"
+def create_neo4j_driver():
+    """Async driver used by the app; the KG loader scripts keep the sync GraphDatabase driver."""
+    return AsyncGraphDatabase.driver(
+        NEO4J_URI,
+        auth=(NEO4J_USER, NEO4J_PASSWORD),
+        max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+        connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT,
+    )
 
 async def summarize_text(text: str) -> str:
     """
@@ -61,62 +86,21 @@ async def summarize_text(text: str) -> str:
     summary = "_".join(first_last) + "_" + timestamp
 
     return summary
-def save_conversation_to_file():
-    try:
-        with open(CONVERSATION_FILE, "w", encoding="utf-8") as f:
-            json.dump(conversation_history, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Error saving conversation: {e}")
 
 # Initialize embedding model
 def initialize_embedding_model():
     return TextEmbedding()
 
 # Clean retrieved content
-def clean_content(raw_text: str) -> str:
-    text = raw_text
-    text = re.sub(r"\n\s*\n", "\n\n", text)
-    text = re.sub(r" +", " ", text)
-    return text.strip()
-
-async def ask_bh_assurance(query: str, embedding_model):
-    """
-    Ask BH Assurance questions using Qdrant for context and Ollama (LLaMA 2 7B) for response.
-    """
-    # Connect to Qdrant
-    
-
-    client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+def payload_text(payload: dict) -> str:
+    # Points loaded before the pre-cleaned `text` field existed only carry the raw content
+    return payload.get("text") or clean_content(payload.get("content", ""))
 
-    # Generate query embedding
-    query_embedding = list(embedding_model.embed([query]))[0]
-
-    # Perform similarity search
-    try:
-        hits = client.search(
-            collection_name=QDRANT_COLLECTION,
-            query_vector=query_embedding,
-            limit=3
-        )
-    except Exception as e:
-        return f"Error querying Qdrant: {str(e)}"
+def is_fallback_answer(answer: str) -> bool:
+    """True for the error/apology messages ask_bh_assurance returns instead of a real answer."""
+    return answer.startswith(("Error ", "Sorry,"))
 
-    # Build context from top hits
-    context = ""
-    for hit in hits:
-        payload = hit.payload
-        content = payload.get("content", "")
-        cleaned_content = clean_content(content)
-        context += cleaned_content + "\n\n"
-
-    # Build conversation history for prompt
-    history_text = ""
-    if conversation_history:
-        history_text = "Previous conversation:\n"
-        for i, (q, r) in enumerate(conversation_history):
-            history_text += f"Q{i+1}: {q}\nA{i+1}: {r}\n"
-
-    prompt = f"""
+PRODUCT_PROMPT_TEMPLATE = """
 Vous êtes un assistant amical de BH Assurance en Tunisie. Répondez aux questions sur l'assurance auto de manière claire et conversationnelle. Utilisez le contexte naturellement, sans mentionner les sources. Si vous ne savez pas, donnez une réponse générale utile et conseillez de contacter BH Assurance.
 
 {history_text}
@@ -128,22 +112,76 @@ Contexte :
 Répondez de manière concise et compréhensible.
 """
 
-    
+async def _build_product_prompt(query: str, retriever, context_builder,
+                                history: list[tuple[str, str]], summary: str) -> str:
+    """
+    Retrieve the Qdrant context for a product question and build the Ollama prompt
+    within the context builder's token budget.
+    Raises if Qdrant cannot be queried.
+    """
+    # Similarity search (dense or hybrid, see retrieval.py)
+    hits = await retriever.search(query, limit=3)
+    passages = [payload_text(payload) for payload in hits]
+
+    # Deduplicate, trim and cap passages and history to the prompt budget
+    template_tokens = count_tokens(PRODUCT_PROMPT_TEMPLATE.format(history_text="", query="", context=""))
+    context, history_text = await context_builder.build(query, passages, history, template_tokens, summary)
+
+    return PRODUCT_PROMPT_TEMPLATE.format(history_text=history_text, query=query, context=context)
+
+async def answer_extractive(query: str, retriever, embedding_service,
+                            max_sentences: int = EXTRACTIVE_MAX_SENTENCES) -> str:
+    """
+    Answer a product question without Ollama: the retrieved sentences most similar
+    to the query, quoted under a short lead-in. Used on request, or by the query
+    routes when Ollama is overloaded (see llm_monitor.py).
+    """
+    try:
+        hits = await retriever.search(query, limit=3)
+    except Exception as e:
+        return f"Error querying Qdrant: {str(e)}"
+
+    sentences = drop_near_duplicates([s for payload in hits for s in split_sentences(payload_text(payload))])
+    # Headings and page numbers make poor answers
+    sentences = [s for s in sentences if count_tokens(s) >= 5]
+    query_vector = await embedding_service.embed(query)
+    scores = await rank_sentences(query_vector, sentences, embedding_service)
+    best = [sentences[i] for i in np.argsort(-scores)[:max_sentences] if scores[i] >= EXTRACTIVE_MIN_SCORE]
+    if not best:
+        return "Sorry, I couldn't find this in our documentation. Please contact BH Assurance for help."
+    return ("D'après les conditions générales de BH Assurance :\n"
+            + "\n".join(f"- {s}" for s in best)
+            + "\n\nPour plus de détails, contactez BH Assurance.")
+
+async def ask_bh_assurance(query: str, retriever, http_client: httpx.AsyncClient, context_builder,
+                           history: list[tuple[str, str]] | None = None, summary: str = ""):
+    """
+    Ask BH Assurance questions using Qdrant for context and Ollama (LLaMA 2 7B) for response.
+    `retriever` is the app's QdrantRetriever, `http_client` the shared pooled Ollama client and
+    `context_builder` the ContextBuilder enforcing the prompt budget. `history` and `summary`
+    come from the chat's ConversationMemory.
+    """
+    try:
+        prompt = await _build_product_prompt(query, retriever, context_builder, history or [], summary)
+    except Exception as e:
+        return f"Error querying Qdrant: {str(e)}"
+
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(180.0, connect=30.0)) as client:
-            response = await client.post(
-                f"{OLLAMA_URL}/api/generate",
-                json={
-                    "model": "llama2:7b",
-                    "prompt": prompt,
-                    "stream": False,       # Get full response at once
-                }
-            )
+        response = await http_client.post(
+            f"{OLLAMA_URL}/api/generate",
+            json={
+                "model": "llama2:7b",
+                "prompt": prompt,
+                "stream": False,       # Get full response at once
+            }
+        )
 
         if response.status_code != 200:
             return f"Error generating response from Ollama: {response.text}"
 
-        answer = response.json().get("response", "").strip()
+        data = response.json()
+        context_builder.record(prompt, data.get("prompt_eval_count"))
+        answer = data.get("response", "").strip()
         if not answer:
             answer = "Sorry, I couldn't generate an answer. Please contact BH Assurance for help."
 
@@ -152,66 +190,209 @@ Répondez de manière concise et compréhensible.
     except Exception as e:
         return f"Error generating response from Ollama: {str(e)}"
 
-    # Save conversation
-    conversation_history.append((query, answer))
-    save_conversation_to_file()
-
     return answer
 
+class OllamaStreamError(Exception):
+    """A streamed answer broke off after some of it was sent."""
+
+async def ask_bh_assurance_stream(query: str, retriever, http_client: httpx.AsyncClient, context_builder,
+                                  history: list[tuple[str, str]] | None = None, summary: str = "") -> AsyncIterator[str]:
+    """
+    Streaming variant of ask_bh_assurance: yields answer fragments as Ollama produces them.
+    A failure before the first fragment yields a fallback message, as ask_bh_assurance
+    returns one; once fragments were sent it raises OllamaStreamError instead, so the
+    partial answer is never taken for a complete one.
+    """
+    try:
+        prompt = await _build_product_prompt(query, retriever, context_builder, history or [], summary)
+    except Exception as e:
+        yield f"Error querying Qdrant: {str(e)}"
+        return
+
+    parts: list[str] = []
+    evaluated_tokens = None
+    done = False
+    try:
+        async with http_client.stream(
+            "POST",
+            f"{OLLAMA_URL}/api/generate",
+            json={
+                "model": "llama2:7b",
+                "prompt": prompt,
+                "stream": True,        # NDJSON, one chunk per generated fragment
+            }
+        ) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                yield f"Error generating response from Ollama: {body.decode(errors='replace')}"
+                return
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                token = chunk.get("response", "")
+                if token:
+                    parts.append(token)
+                    yield token
+                if chunk.get("done"):
+                    evaluated_tokens = chunk.get("prompt_eval_count")
+                    done = True
+                    break
+
+    except httpx.TimeoutException as e:
+        if parts:
+            raise OllamaStreamError(f"Ollama timed out mid-answer: {e}") from e
+        yield "Sorry, the request timed out. Please try again or contact BH Assurance for help."
+        return
+    except Exception as e:
+        # Connection drops and malformed NDJSON lines alike
+        if parts:
+            raise OllamaStreamError(f"Ollama stream interrupted: {e}") from e
+        yield f"Error generating response from Ollama: {str(e)}"
+        return
+    if parts and not done:
+        raise OllamaStreamError("Ollama stream ended before the answer was complete")
+
+    context_builder.record(prompt, evaluated_tokens)
+    answer = "".join(parts).strip()
+    if not answer:
+        yield "Sorry, I couldn't generate an answer. Please contact BH Assurance for help."
+
+# Guarantees closest to a question (vector index built by KG/enhance_KG.py), the products
+# offering them and, for a known client, the client's contracts that include them
+GARANTIE_VECTOR_CYPHER = """
+CALL db.index.vector.queryNodes('garantie_embedding', $limit, $vector) YIELD node AS g, score
+OPTIONAL MATCH (p:Produit)-[:OFFRE]->(g)
+WITH g, score, collect(DISTINCT p.lib_produit) AS produits
+OPTIONAL MATCH (holder:PersonnePhysique|PersonneMorale {ref_personne: $ref_personne})-[:A_SOUSCRIT]->(c:Contrat)-[r:INCLUT]->(g)
+RETURN g.code_garantie AS code_garantie, g.lib_garantie AS lib_garantie, g.description AS description,
+       score, produits,
+       collect(CASE WHEN c IS NULL THEN NULL ELSE {num_contrat: c.num_contrat, lib_produit: c.lib_produit,
+               lib_etat_contrat: c.lib_etat_contrat, capital_assure: r.capital_assure} END) AS contrats
+ORDER BY score DESC
+"""
+
 # Neo4j Agent Class (Part 2: Client Data Analysis)
 class Neo4jAgent:
-    def __init__(self, memory_enabled: bool = False, memory_path: str | None = None, memory_max: int = 100):
+    def __init__(self, memory_enabled: bool = False, memory_path: str | None = None, memory_max: int = AGENT_MEMORY_MAX,
+                 driver=None, http_client: httpx.AsyncClient | None = None, cypher_cache=None, embedding_service=None,
+                 memory_log: MemoryLog | None = None, llm_monitor: LLMLoadMonitor | None = None):
         self.uri = NEO4J_URI
         self.user = NEO4J_USER
         self.password = NEO4J_PASSWORD
         self.database = NEO4J_DATABASE
-        try:
-            self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password))
-            self.driver.verify_connectivity()
-        except Exception as e:
-            raise SystemExit(
-                f"Connection failed to {self.uri} as {self.user}: {e}\n"
-                "Tips: 1) Ensure Neo4j Desktop is running and the database is active. "
-                "2) Verify the URI matches your Neo4j settings. "
-                "3) Check username and password."
-            )
+        # The app injects its shared async driver and Ollama client; standalone use opens its own
+        # (connections are made lazily, on the first query).
+        self._owns_driver = driver is None
+        self.driver = driver if driver is not None else create_neo4j_driver()
+        self._owns_http_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(timeout=httpx.Timeout(180.0, connect=30.0))
+        # The app's monitor, so the load its Ollama calls add is seen by the product routes
+        self.llm_monitor = llm_monitor
 
         # Memory settings
         self.memory_enabled = memory_enabled
         self.memory_path = memory_path or os.path.join(os.getcwd(), "agent_memory.json")
         self.memory_max = memory_max
-        self._memory_cache: list[dict] = []
-        self._conversation: dict[str, Any] = {
-            'person_matricule': None,
-            'sinistres': []
-        }
-        if self.memory_enabled:
+        self.memory = MemoryIndex(memory_max)
+        # Optional: few-shot examples are then picked by question embedding rather than shared words
+        self.embedding_service = embedding_service
+        # Shared append-only store (see agent_memory.MemoryLog); without it memory lives in memory_path
+        self.memory_log = memory_log
+        self._memory_last_id: str | None = None
+        self._warm_task: asyncio.Task | None = None
+        if self.memory_enabled and self.memory_log is None:
             self._load_memory()
-
-    def close(self):
-        self.driver.close()
-        if self.memory_enabled:
+        # Successful generated Cypher per question shape (see cypher_cache.py); None disables it
+        self.cypher_cache = cypher_cache
+        # Generated queries are checked against the schema and EXPLAINed before they run
+        self.validator = CypherValidator(self.driver, self.database)
+        self._stats = {"template_hits": 0, "llm_queries": 0, "validation_repairs": 0,
+                       "formatted_without_llm": 0, "formatted_with_llm": 0}
+
+    async def close(self):
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+        if self._owns_driver:
+            await self.driver.close()
+        if self._owns_http_client:
+            await self.http_client.aclose()
+        if self.memory_enabled and self.memory_log is None:
             self._save_memory()
 
     # ---------------- Memory management -----------------
-    def _load_memory(self):
+    def _read_memory_file(self) -> list[dict]:
         try:
             if os.path.exists(self.memory_path):
                 with open(self.memory_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     if isinstance(data, list):
-                        self._memory_cache = data[-self.memory_max:]
+                        return data[-self.memory_max:]
         except Exception:
-            self._memory_cache = []
+            pass
+        return []
+
+    def _load_memory(self):
+        for entry in self._read_memory_file():
+            self.memory.add(entry)
+
+    async def _sync_memory(self):
+        """Pull the entries other workers (or this one) appended to the shared log since the last sync."""
+        if self.memory_log is None:
+            return
+        try:
+            if self._memory_last_id is None:
+                # The first worker to start imports the entries learned before the shared log existed
+                await self.memory_log.seed(self._read_memory_file())
+            for entry_id, entry, vector in await self.memory_log.read_since(self._memory_last_id):
+                self.memory.add(entry, vector)
+                self._memory_last_id = entry_id
+        except Exception as e:
+            print(f"Agent memory sync failed, using the local view: {e}")
 
     def _save_memory(self):
         try:
             with open(self.memory_path, 'w', encoding='utf-8') as f:
-                json.dump(self._memory_cache[-self.memory_max:], f, ensure_ascii=False, indent=2)
+                json.dump(self.memory.entries(), f, ensure_ascii=False, indent=2)
         except Exception:
             pass
 
-    def _add_memory(self, nl_query: str, cypher: str, result_sample: list[dict]):
+    async def warm_memory(self):
+        """Load the memory and start embedding its entries in the background (called at startup)."""
+        if self.memory_enabled:
+            await self._sync_memory()
+            self._schedule_memory_embedding()
+
+    def _schedule_memory_embedding(self):
+        if (self.embedding_service is None or not self.memory.missing_vectors(1)
+                or (self._warm_task is not None and not self._warm_task.done())):
+            return
+        self._warm_task = asyncio.create_task(self._embed_missing_memory())
+
+    async def _embed_missing_memory(self):
+        # Entries loaded from disk or synced without a vector are embedded here, a batch at a
+        # time, never on the request path; until then they are found by word overlap
+        try:
+            while missing := self.memory.missing_vectors(MEMORY_EMBED_BATCH):
+                vectors = await self.embedding_service.embed_many([q for _, q in missing])
+                for (entry_id, _), vector in zip(missing, vectors):
+                    self.memory.set_vector(entry_id, vector)
+        except Exception as e:
+            print(f"Memory embedding failed, the remaining entries use word overlap: {e}")
+
+    async def _embed_question(self, nl_query: str) -> np.ndarray | None:
+        if self.embedding_service is None:
+            return None
+        try:
+            return await self.embedding_service.embed(nl_query)
+        except Exception as e:
+            print(f"Memory embedding failed, falling back to word overlap: {e}")
+            return None
+
+    async def _add_memory(self, nl_query: str, cypher: str, result_sample: list[dict]):
+        # Only called once the query ran without error, so it is safe to reuse for the same shape
+        if self.cypher_cache is not None:
+            await self.cypher_cache.store(nl_query, cypher)
         if not self.memory_enabled:
             return
         ts = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
@@ -222,42 +403,40 @@ class Neo4jAgent:
             "result_keys": list(result_sample[0].keys()) if result_sample else [],
             "result_count": len(result_sample),
         }
-        self._memory_cache.append(entry)
-        if len(self._memory_cache) > self.memory_max:
-            self._memory_cache = self._memory_cache[-self.memory_max:]
+        # Usually cached already: the question was embedded to pick its few-shot examples
+        vector = await self._embed_question(nl_query)
+        if self.memory_log is not None:
+            try:
+                # The local view picks it up on the next sync, like the other workers
+                await self.memory_log.append(entry, vector)
+                return
+            except Exception as e:
+                print(f"Agent memory append failed, keeping the entry locally: {e}")
+        self.memory.add(entry, vector)
 
-    def _relevant_memory(self, nl_query: str, k: int = 3) -> list[dict]:
-        if not self.memory_enabled or not self._memory_cache:
+    async def _relevant_memory(self, nl_query: str, k: int = 3) -> list[dict]:
+        if not self.memory_enabled:
             return []
-        tokens = {t for t in re.findall(r"[a-zA-Zéèêàùûôï0-9_]+", nl_query.lower()) if len(t) > 3}
-        scored = []
-        for e in self._memory_cache:
-            etoks = {t for t in re.findall(r"[a-zA-Zéèêàùûôï0-9_]+", e['query'].lower()) if len(t) > 3}
-            overlap = len(tokens & etoks)
-            if overlap > 0:
-                scored.append((overlap, e))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [e for _, e in scored[:k]]
+        await self._sync_memory()
+        self._schedule_memory_embedding()
+        if not len(self.memory):
+            return []
+        return self.memory.search(nl_query, k, await self._embed_question(nl_query))
 
     # ---------------- Cypher generation -----------------
-    async def _generate_cypher_query(self, natural_language_query: str) -> str:
+    async def _generate_cypher_query(self, natural_language_query: str, context: ClientContext) -> str:
         kg_schema = """Knowledge Graph Schema: PersonneMorale - ref_personne: Unique identifier for the moral person (integer). - raison_sociale: Company name (string). - matricule_fiscale: Fiscal ID (string). - lib_secteur_activite: Sector of activity (string). - lib_activite: Activity (string). - ville: City (string). - lib_gouvernorat: Governorate (string). - ville_gouvernorat: Governorate city (string). PersonnePhysique - ref_personne: Unique identifier for the physical person (integer). - nom_prenom: Full name (string). - date_naissance: Date of birth (date string YYYY-MM-DD). - lieu_naissance: Place of birth (string). - code_sexe: Gender code (string). - situation_familiale: Marital status (string). - num_piece_identite: ID number (integer). - lib_secteur_activite: Sector of activity (string). - lib_profession: Profession (string). - ville: City (string). - lib_gouvernorat: Governorate (string). - ville_gouvernorat: Governorate city (string). Contrat - num_contrat: Contract number (integer). - lib_produit: Product name (string). - effet_contrat: Contract effective date (date string YYYY-MM-DD). - date_expiration: Contract expiration date (date string YYYY-MM-DD). - prochain_terme: Next term (string). - lib_etat_contrat: Contract status (string). - branche: Branch (string). - somme_quittances: Sum of receipts (float, TND). - statut_paiement: Payment status (string). - capital_assure: Insured capital (float, TND). Sinistre - num_sinistre: Claim number (integer). - lib_branche: Branch (string). - lib_sous_branche: Sub-branch (string). - lib_produit: Product name (string). - nature_sinistre: Nature of claim (string). - lib_type_sinistre: Type of claim (string). - taux_responsabilite: Responsibility rate (float). - date_survenance: Date of occurrence (date string YYYY-MM-DD). - date_declaration: Date of declaration (date string YYYY-MM-DD). - date_ouverture: Date of opening (date string YYYY-MM-DD). - observation_sinistre: Claim observation (string). - lib_etat_sinistre: Claim status (string). - lieu_accident: Accident location (string). - motif_reouverture: Reopening reason (string). - montant_encaisse: Amount collected (float). - montant_a_encaisser: Amount to be collected (float). Branche - lib_branche: Branch name (string). SousBranche - lib_sous_branche: Sub-branch name (string). Produit - lib_produit: Product name (string). Garantie - code_garantie: Unique code for the guarantee (integer). - lib_garantie: Guarantee name (string). - description: Description of the guarantee (string). ProfilCible - lib_profil: Target profile description (string, e.g., "Emprunteurs" or "chefs de famille"). Relationships: - [:A_SOUSCRIT], [:CONCERNE], [:EST_UNE_SOUS_BRANCHE_DE], [:EST_UN_PRODUIT_DE], [:PORTE_SUR], [:DE_BRANCHE], [:DE_SOUS_BRANCHE], [:OFFRE], [:INCLUT], [:DESTINE_A] """ # Memory context memory_context = "" if self.memory_enabled: rel_mem = self._relevant_memory(natural_language_query, k=3) if rel_mem: mem_lines = [] for m in rel_mem: mem_lines.append(f"- Q: {m['query']} => Cypher: {m['cypher'][:220]}... (résultats: {m['result_count']})") memory_context = "Historique pertinent récent:\n" + "\n".join(mem_lines) + "\n\n" # Conversation context conversation_context = "" if self._conversation.get('person_matricule'): conversation_context += f"L'utilisateur s'est précédemment identifié comme client avec matricule_fiscale = {self._conversation['person_matricule']}.\n" if self._conversation.get('sinistres'): nums = ', '.join(str(n) for n in self._conversation['sinistres'][:15]) conversation_context += f"Les derniers sinistres référencés dans la conversation ont les num_sinistre: {nums}.\n" if conversation_context: conversation_context = "Contexte conversationnel:\n" + conversation_context + "\n" # Prompt for Ollama prompt = f"""Given the following Knowledge Graph schema, translate the natural language query into a Cypher query. {kg_schema} {conversation_context}{memory_context} Natural Language Query: {natural_language_query} Return only the Cypher query. Do not include extra text or explanations."""  # Keep your full KG schema here
 
         memory_context = ""
         if self.memory_enabled:
-            rel_mem = self._relevant_memory(natural_language_query, k=3)
+            rel_mem = await self._relevant_memory(natural_language_query, k=3)
             if rel_mem:
                 mem_lines = []
                 for m in rel_mem:
                     mem_lines.append(f"- Q: {m['query']} => Cypher: {m['cypher'][:220]}... (résultats: {m['result_count']})")
                 memory_context = "Historique pertinent récent:\n" + "\n".join(mem_lines) + "\n\n"
 
-        conversation_context = ""
-        if self._conversation.get('person_matricule'):
-            conversation_context += f"L'utilisateur s'est précédemment identifié comme client avec matricule_fiscale = {self._conversation['person_matricule']}.\n"
-        if self._conversation.get('sinistres'):
-            nums = ', '.join(str(n) for n in self._conversation['sinistres'][:15])
-            conversation_context += f"Les derniers sinistres référencés dans la conversation ont les num_sinistre: {nums}.\n"
+        conversation_context = context.prompt()
         if conversation_context:
             conversation_context = "Contexte conversationnel:\n" + conversation_context + "\n"
 
@@ -272,29 +451,31 @@ Natural Language Query: {natural_language_query}
 Return only the Cypher query. Do not include extra text or explanations.
 """
 
-        async with httpx.AsyncClient(timeout=httpx.Timeout(180.0, connect=30.0)) as client:
-            try:
-                response = await client.post(
-                    f"{OLLAMA_URL}/api/generate",
-                    json={
-                        "model": "llama2:7b",
-                        "prompt": prompt,
-                        "max_tokens": 500,
-                        "temperature": 0,
-                        "stream":False
-                    }
-                )
-                data = response.json()
-                cypher_query = data.get("response", "")
-            except Exception as e:
-                print(f"Ollama request failed: {e}")
-                cypher_query = ""
+        try:
+            response = await self._ollama_generate({
+                "model": "llama2:7b",
+                "prompt": prompt,
+                "max_tokens": 500,
+                "temperature": 0,
+                "stream": False
+            })
+            data = response.json()
+            cypher_query = data.get("response", "")
+        except Exception as e:
+            print(f"Ollama request failed: {e}")
+            cypher_query = ""
 
         if cypher_query.startswith("```cypher") and cypher_query.endswith("```"):
             cypher_query = cypher_query[len("```cypher\n"): -len("```")].strip()
 
         return self._sanitize_cypher(cypher_query)
 
+    async def _ollama_generate(self, payload: dict) -> httpx.Response:
+        if self.llm_monitor is None:
+            return await self.http_client.post(f"{OLLAMA_URL}/api/generate", json=payload)
+        async with self.llm_monitor.track(answer=False):
+            return await self.http_client.post(f"{OLLAMA_URL}/api/generate", json=payload)
+
     # ---------------- Sanitize -----------------
     def _sanitize_cypher(self, query: str) -> str:
         query = query.strip().rstrip(';').strip()
@@ -311,7 +492,7 @@ Return only the Cypher query. Do not include extra text or explanations.
 
     # ---------------- Refine query on error -----------------
     async def _refine_query_on_error(self, nl_query: str, bad_cypher: str, error_text: str) -> str:
-        repair_prompt = f"""La requête Cypher a provoqué une erreur Neo4j.
+        repair_prompt = f"""La requête Cypher a été rejetée par Neo4j ou par la vérification du schéma.
 Question: {nl_query}
 Requête Cypher initiale:
 {bad_cypher}
@@ -322,94 +503,123 @@ Corrige la requête en respectant les règles:
 - RETURN uniquement des variables.
 - MATCH / OPTIONAL MATCH appropriés.
 - EXISTS {{ MATCH ... }} pour tester l'existence.
-- Aucun label ou propriété inventé.
+- Aucun label ou propriété inventé: utilise les noms suggérés dans le message d'erreur.
 - Ajoute LIMIT 100 si absent.
 Renvoie seulement la requête Cypher corrigée.
 """
-        async with httpx.AsyncClient(timeout=httpx.Timeout(180.0, connect=30.0)) as client:
-            try:
-                response = await client.post(
-                    f"{OLLAMA_URL}/api/generate",
-                    json={
-                        "model": "llama2:7b",
-                        "prompt": repair_prompt,
-                        "max_tokens": 400,
-                        "temperature": 0,
-                        "stream": False
-                    }
-                )
-                data = response.json()
-                fixed = data.get("response", "")
-            except Exception as e:
-                print(f"Ollama request failed: {e}")
-                fixed = bad_cypher
+        try:
+            response = await self._ollama_generate({
+                "model": "llama2:7b",
+                "prompt": repair_prompt,
+                "max_tokens": 400,
+                "temperature": 0,
+                "stream": False
+            })
+            data = response.json()
+            fixed = data.get("response", "")
+        except Exception as e:
+            print(f"Ollama request failed: {e}")
+            fixed = bad_cypher
         if fixed.startswith("```cypher") and fixed.endswith("```"):
             fixed = fixed[len("```cypher\n"): -len("```")].strip()
         return self._sanitize_cypher(fixed)
 
     # ---------------- Format results -----------------
     async def format_results(self, natural_language_query: str, results: List[Dict[str, Any]]) -> str:
-        if not results:
-            neg_prompt = f"""La requête utilisateur n'a retourné aucun résultat dans Neo4j.
-Question: {natural_language_query}
-Réponds en français, commence par "Non", explique brièvement et suggère une reformulation possible.
-"""
-            async with httpx.AsyncClient(timeout=httpx.Timeout(180.0, connect=30.0)) as client:
-                try:
-                    response = await client.post(
-                        f"{OLLAMA_URL}/api/generate",
-                        json={
-                            "model": "llama2:7b",
-                            "prompt": neg_prompt,
-                            "max_tokens": 120,
-                            "temperature": 0,
-                            "stream": False
-                        }
-                    )
-                    data = response.json()
-                    txt = data.get("response", "")
-                    if not txt.lower().startswith("non"):
-                        txt = "Non, aucun résultat correspondant n'a été trouvé." if not txt else f"Non. {txt}"
-                    return txt
-                except Exception:
-                    return "Non, aucun résultat correspondant n'a été trouvé."
-
-        results_json = json.dumps(results, indent=2, ensure_ascii=False)
+        # Empty results and the simple shapes are phrased without an LLM round trip
+        formatted = format_records(results)
+        if formatted is not None:
+            self._stats["formatted_without_llm"] += 1
+            return formatted
+        self._stats["formatted_with_llm"] += 1
+
+        results_json = json.dumps(results[:RESULT_LLM_MAX_ROWS], ensure_ascii=False, default=str)
+        if len(results) > RESULT_LLM_MAX_ROWS:
+            results_json += f"\n({len(results)} résultats au total, seuls les {RESULT_LLM_MAX_ROWS} premiers sont montrés)"
         prompt = f"""Formate les résultats suivants en réponse claire en français, adaptée à la question:
 Question: {natural_language_query}
 Résultats: {results_json}
 Réponse formatée:"""
-        async with httpx.AsyncClient(timeout=httpx.Timeout(180.0, connect=30.0)) as client:
-            try:
-                response = await client.post(
-                    f"{OLLAMA_URL}/api/generate",
-                    json={
-                        "model": "llama2:7b",
-                        "prompt": prompt,
-                        "max_tokens": 1000,
-                        "temperature": 0,
-                        "stream": False
-                    }
-                )
-                data = response.json()
-                formatted_response = data.get("response", "")
-            except Exception:
-                formatted_response = "Voici les résultats trouvés."
+        try:
+            response = await self._ollama_generate({
+                "model": "llama2:7b",
+                "prompt": prompt,
+                "max_tokens": 1000,
+                "temperature": 0,
+                "stream": False
+            })
+            data = response.json()
+            formatted_response = data.get("response", "")
+        except Exception:
+            formatted_response = "Voici les résultats trouvés."
         formatted_response = re.sub(r"€\s*", " TND ", formatted_response)
         formatted_response = re.sub(r"\b(euros?|EUROS?)\b", "TND", formatted_response, flags=re.IGNORECASE)
         return formatted_response
 
-    async def execute_query(self, natural_language_query: str):
-        cypher_query = await self._generate_cypher_query(natural_language_query)
+    async def _run_read(self, cypher: str, **params) -> list[dict]:
+        """
+        Run a query in a managed read transaction on the async driver, so a slow query
+        only suspends its own request. Generated queries that try to write are rejected
+        by the read access mode; transient errors are retried by the driver.
+        """
+        @unit_of_work(timeout=NEO4J_TX_TIMEOUT)
+        async def work(tx):
+            result = await tx.run(cypher, params)
+            return await result.data()
+
+        async with self.driver.session(database=self.database, default_access_mode=READ_ACCESS) as session:
+            return await session.execute_read(work)
+
+    async def execute_query(self, natural_language_query: str, context: ClientContext | None = None):
+        """
+        Answer a client question from the KG. `context` is the chat's client context
+        (see client_context.py): it feeds the Cypher prompt and is updated in place
+        with the client and claims found; without one, the question stands alone.
+        """
+        context = context if context is not None else ClientContext()
+        # Known question shapes run a fixed parameterized query: no LLM round trip, no repair loop
+        template = match_template(natural_language_query)
+        if template is not None:
+            name, cypher_query, params = template
+            print(f"Cypher template '{name}' with {params}")
+            self._stats["template_hits"] += 1
+            records = await self._run_read(cypher_query, **params)
+            self._update_conversation_context(natural_language_query, records, context)
+            return await self.format_results(natural_language_query, records)
+
+        if self.cypher_cache is not None:
+            cached = await self.cypher_cache.lookup(natural_language_query)
+            if cached is not None:
+                cypher_query, params = cached
+                print(f"Cached Cypher for this question shape with {params}")
+                try:
+                    records = await self._run_read(cypher_query, **params)
+                except Exception as e:
+                    print(f"Cached Cypher failed, regenerating: {e}")
+                    await self.cypher_cache.evict(natural_language_query)
+                else:
+                    self._update_conversation_context(natural_language_query, records, context)
+                    return await self.format_results(natural_language_query, records)
+
+        self._stats["llm_queries"] += 1
+        cypher_query = await self._generate_cypher_query(natural_language_query, context)
         print(f"Generated Cypher Query: {cypher_query}")
         attempts = 0
         last_error = None
         records = []
         while attempts < 3:
+            problems = await self.validator.validate(cypher_query)
+            if problems:
+                last_error = "\n".join(problems)
+                print("Generated Cypher failed validation: ", last_error)
+                self._stats["validation_repairs"] += 1
+                cypher_query = await self._refine_query_on_error(natural_language_query, cypher_query, last_error)
+                print(f"Refined Cypher Query (attempt {attempts+2}): {cypher_query}")
+                attempts += 1
+                continue
             try:
-                with self.driver.session(database=self.database) as session:
-                    result = session.run(cypher_query)
-                    records = [record.data() for record in result]
+                records = await self._run_read(cypher_query)
+                last_error = None
                 break
             except Exception as e:
                 msg = str(e)
@@ -424,39 +634,51 @@ Réponse formatée:"""
                     raise
         if attempts == 3 and last_error:
             raise RuntimeError(f"Failed after retries. Last error: {last_error}")
-        self._update_conversation_context(natural_language_query, records)
+        self._update_conversation_context(natural_language_query, records, context)
         formatted_result = await self.format_results(natural_language_query, records)
-        self._add_memory(natural_language_query, cypher_query, records[:1])
+        await self._add_memory(natural_language_query, cypher_query, records[:1])
         return formatted_result
 
-    def _update_conversation_context(self, nl_query: str, records: list[dict]):
+    def stats(self) -> dict:
+        cache_hits = self.cypher_cache.stats()["hits"] if self.cypher_cache is not None else 0
+        total = self._stats["template_hits"] + cache_hits + self._stats["llm_queries"]
+        stats = {**self._stats, "template_hit_rate": self._stats["template_hits"] / total if total else 0.0,
+                 "llm_rate": self._stats["llm_queries"] / total if total else 0.0}
+        if self.cypher_cache is not None:
+            stats["cypher_cache"] = self.cypher_cache.stats()
+        return stats
+
+    async def search_guarantees(self, query_vector: np.ndarray, ref_personne: int | None = None,
+                                limit: int = 5) -> list[dict]:
+        """
+        Single-hop graph RAG: the guarantees whose description is closest to the query
+        vector, with the products offering them and the client's contracts including
+        them (empty unless `ref_personne` is given), in one Cypher round trip.
+        """
+        return await self._run_read(GARANTIE_VECTOR_CYPHER, vector=[float(x) for x in query_vector],
+                                    ref_personne=ref_personne, limit=limit)
+
+    def _update_conversation_context(self, nl_query: str, records: list[dict], context: ClientContext):
         matricule_match = re.search(r"matricule\s+fiscale\s*(?:est|=|:)?\s*([A-Z0-9]+)", nl_query, flags=re.IGNORECASE)
-        if matricule_match:
-            new_mat = matricule_match.group(1).strip()
-            if new_mat and new_mat != self._conversation.get('person_matricule'):
-                self._conversation['person_matricule'] = new_mat
-                self._conversation['sinistres'] = []
-        sin_numbers = set(self._conversation.get('sinistres', []))
+        if matricule_match and matricule_match.group(1).strip():
+            context.set_client(matricule=matricule_match.group(1).strip())
+        sin_numbers = []
         for rec in records:
             for val in rec.values():
                 try:
                     if isinstance(val, dict) and 'num_sinistre' in val:
-                        sin_numbers.add(val['num_sinistre'])
+                        sin_numbers.append(val['num_sinistre'])
                     else:
                         num = getattr(val, 'get', None)
                         if callable(num):
                             maybe = val.get('num_sinistre')
                             if maybe is not None:
-                                sin_numbers.add(maybe)
+                                sin_numbers.append(maybe)
                 except Exception:
                     continue
-            if 'num_sinistre' in rec:
-                try:
-                    sin_numbers.add(rec['num_sinistre'])
-                except Exception:
-                    pass
-        if sin_numbers:
-            self._conversation['sinistres'] = list(sorted(sin_numbers))[-50:]
+            if 'num_sinistre' in rec and rec['num_sinistre'] is not None:
+                sin_numbers.append(rec['num_sinistre'])
+        context.add_sinistres(dict.fromkeys(sin_numbers))
 
 # Classification function to determine query type
 
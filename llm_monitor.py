@@ -0,0 +1,73 @@
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Product questions switch to extractive answers when Ollama is past either threshold
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", 4))
+LLM_LATENCY_THRESHOLD_S = float(os.getenv("LLM_LATENCY_THRESHOLD_S", 30.0))
+# Latency is averaged over the calls completed in this window; once it empties, Ollama is tried again
+LLM_LATENCY_WINDOW_S = float(os.getenv("LLM_LATENCY_WINDOW_S", 60.0))
+
+
+class LLMLoadMonitor:
+    """
+    Tracks the Ollama calls of this worker, product answers and the Neo4j agent's
+    Cypher generation, repair and formatting alike: how many are in flight and how
+    long the recent ones took. `overloaded()` tells the query routes to answer
+    product questions extractively instead of queueing behind a saturated LLM.
+    """
+
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT, latency_threshold: float = LLM_LATENCY_THRESHOLD_S,
+                 window_seconds: float = LLM_LATENCY_WINDOW_S):
+        self.max_in_flight = max_in_flight
+        self.latency_threshold = latency_threshold
+        self.window_seconds = window_seconds
+        self.in_flight = 0
+        self._latencies: deque[tuple[float, float]] = deque()
+        self._stats = {"llm_answers": 0, "agent_llm_calls": 0, "extractive_answers": 0, "degraded_answers": 0}
+
+    def _recent_latency(self) -> float | None:
+        cutoff = time.monotonic() - self.window_seconds
+        while self._latencies and self._latencies[0][0] < cutoff:
+            self._latencies.popleft()
+        if not self._latencies:
+            return None
+        return sum(latency for _, latency in self._latencies) / len(self._latencies)
+
+    def overloaded(self) -> bool:
+        if self.in_flight >= self.max_in_flight:
+            return True
+        latency = self._recent_latency()
+        return latency is not None and latency >= self.latency_threshold
+
+    @asynccontextmanager
+    async def track(self, answer: bool = True):
+        """Wrap one LLM call: a product answer (including a fully consumed stream), or with answer=False an agent call."""
+        self.in_flight += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._latencies.append((time.monotonic(), time.monotonic() - start))
+            self._stats["llm_answers" if answer else "agent_llm_calls"] += 1
+
+    def record_extractive(self, degraded: bool):
+        """Count an extractive answer; `degraded` when it was chosen because of load rather than requested."""
+        self._stats["extractive_answers"] += 1
+        if degraded:
+            self._stats["degraded_answers"] += 1
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "in_flight": self.in_flight,
+            "recent_latency_s": self._recent_latency(),
+            "overloaded": self.overloaded(),
+            "max_in_flight": self.max_in_flight,
+            "latency_threshold_s": self.latency_threshold,
+        }
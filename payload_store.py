@@ -0,0 +1,46 @@
+import os
+import json
+import numpy as np
+
+
+def offsets_path(payloads_file: str) -> str:
+    return f"{payloads_file}.offsets.npy"
+
+
+class PayloadStore:
+    """
+    Read-only payloads of an exported index, one per vector row: a blob of UTF-8
+    JSON records and the byte offset of each (row i spans offsets[i]:offsets[i + 1]).
+    Both files are memory-mapped, so workers share their pages through the OS page
+    cache and only the records of a hit are ever decoded.
+    """
+
+    def __init__(self, payloads_file: str):
+        self.offsets = np.load(offsets_path(payloads_file), mmap_mode="r")
+        # np.memmap refuses empty files: an empty export has nothing to map
+        self.blob = (np.memmap(payloads_file, dtype=np.uint8, mode="r")
+                     if os.path.getsize(payloads_file) else np.zeros(0, dtype=np.uint8))
+
+    def __len__(self) -> int:
+        return max(len(self.offsets) - 1, 0)
+
+    def __getitem__(self, row: int) -> dict:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return json.loads(self.blob[start:end].tobytes())
+
+    @staticmethod
+    def write(payloads_file: str, payloads: list[dict]):
+        """Write the blob and its offsets, each through a temp file so no reader sees a partial one."""
+        offsets = [0]
+        tmp = f"{payloads_file}.tmp"
+        with open(tmp, "wb") as f:
+            for payload in payloads:
+                record = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+                f.write(record)
+                offsets.append(offsets[-1] + len(record))
+        tmp_offsets = f"{offsets_path(payloads_file)}.tmp"
+        with open(tmp_offsets, "wb") as f:
+            np.save(f, np.asarray(offsets, dtype=np.int64))
+        # Running workers keep their mapping of the old files until they restart
+        os.replace(tmp, payloads_file)
+        os.replace(tmp_offsets, offsets_path(payloads_file))
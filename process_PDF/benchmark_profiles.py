@@ -0,0 +1,137 @@
+import os
+import json
+import math
+import time
+import argparse
+from fastembed import TextEmbedding
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from dotenv import load_dotenv
+from benchmark_retrieval import load_queries, page_key, percentile_ms
+from load_to_qdrant import PROFILES, HNSW_M, HNSW_EF_CONSTRUCT, collection_profile, dense_vector
+
+load_dotenv()
+
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "pdf_embeddings")
+
+# -----------------------------
+# Helpers
+# -----------------------------
+
+def copy_collection(client: QdrantClient, source: str, target: str, profile: str, m: int, ef_construct: int,
+                    batch_size: int = 256) -> tuple[int, int]:
+    """Copy the dense vectors and payloads of `source` into a fresh collection using `profile`."""
+    config = collection_profile(profile, m, ef_construct)
+    points, dim, offset = 0, None, None
+    while True:
+        batch, offset = client.scroll(source, limit=batch_size, offset=offset, with_payload=True, with_vectors=True)
+        if batch and dim is None:
+            dim = len(dense_vector(batch[0].vector))
+            client.recreate_collection(
+                collection_name=target,
+                vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE, on_disk=config["on_disk"]),
+                hnsw_config=config["hnsw_config"],
+                quantization_config=config["quantization_config"]
+            )
+        if batch:
+            client.upsert(target, points=[
+                models.PointStruct(id=p.id, vector=dense_vector(p.vector), payload=p.payload) for p in batch
+            ])
+            points += len(batch)
+        if offset is None:
+            break
+    if dim is None:
+        raise SystemExit(f"Collection '{source}' is empty")
+    return points, dim
+
+
+def wait_until_indexed(client: QdrantClient, collection: str, timeout: float = 600.0):
+    deadline = time.monotonic() + timeout
+    while client.get_collection(collection).status != models.CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            raise SystemExit(f"Collection '{collection}' still optimizing after {timeout:.0f}s")
+        time.sleep(1)
+
+
+def estimate_ram_bytes(profile: str, points: int, dim: int, m: int) -> int:
+    """
+    Resident size of the vector data: float32 vectors unless memory-mapped from disk,
+    the quantized copy, and the HNSW layer-0 links (2*m ids of 4 bytes per point).
+    Payloads and upper graph layers are left out; they are the same for every profile.
+    """
+    on_disk, quantization = PROFILES[profile]
+    vectors = 0 if on_disk else points * dim * 4
+    quantized = {"int8": points * dim, "binary": points * math.ceil(dim / 8)}.get(quantization, 0)
+    links = points * 2 * (m if profile != "default" else 16) * 4
+    return vectors + quantized + links
+
+# -----------------------------
+# Main
+# -----------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare recall, latency and RAM of the vector storage profiles")
+    parser.add_argument("--queries", default=os.path.join(os.path.dirname(__file__), "queries.txt"), help="One query per line")
+    parser.add_argument("--qrels", default=None,
+                        help="Optional JSON {query: [\"<title>:<page>\", ...]} of relevant pages. "
+                             "Without it, results are compared with an exact float32 search on --collection.")
+    parser.add_argument("--collection", default=COLLECTION_NAME, help="Source collection copied into each profile")
+    parser.add_argument("--host", default=QDRANT_HOST)
+    parser.add_argument("--port", type=int, default=QDRANT_PORT)
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--hnsw-m", type=int, default=HNSW_M)
+    parser.add_argument("--hnsw-ef-construct", type=int, default=HNSW_EF_CONSTRUCT)
+    parser.add_argument("--oversampling", type=float, default=2.0, help="Quantized candidates rescored per result (default: 2.0)")
+    parser.add_argument("-k", type=int, default=3, help="Results per query (default: 3, as in ask_bh_assurance)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query (default: 5)")
+    parser.add_argument("--keep", action="store_true", help="Keep the per-profile collections after the run")
+    args = parser.parse_args()
+
+    client = QdrantClient(host=args.host, port=args.port)
+    queries = load_queries(args.queries)
+    dense_vectors = [v.tolist() for v in TextEmbedding().embed(queries)]
+
+    if args.qrels:
+        with open(args.qrels, encoding="utf-8") as f:
+            qrels = {q: set(pages) for q, pages in json.load(f).items()}
+        references = [qrels.get(q, set()) for q in queries]
+    else:
+        exact = models.SearchParams(exact=True)
+        references = [
+            {page_key(h.payload) for h in client.query_points(args.collection, query=v, limit=args.k,
+                                                              with_payload=True, search_params=exact).points}
+            for v in dense_vectors
+        ]
+
+    label = "recall" if args.qrels else "overlap_exact"
+    search_params = models.SearchParams(
+        quantization=models.QuantizationSearchParams(rescore=True, oversampling=args.oversampling)
+    )
+    print(f"{'profile':<12} {label + '@' + str(args.k):>18} {'p50 ms':>8} {'p99 ms':>8} {'est. RAM MB':>12}")
+    for profile in args.profiles.split(","):
+        target = f"{args.collection}_bench_{profile.replace('-', '_')}"
+        points, dim = copy_collection(client, args.collection, target, profile, args.hnsw_m, args.hnsw_ef_construct)
+        wait_until_indexed(client, target)
+        try:
+            latencies, scores = [], []
+            for i, vector in enumerate(dense_vectors):
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    hits = client.query_points(target, query=vector, limit=args.k, with_payload=True,
+                                               search_params=search_params).points
+                    latencies.append(time.perf_counter() - start)
+                if references[i]:
+                    found = {page_key(h.payload) for h in hits}
+                    scores.append(len(found & references[i]) / len(references[i]))
+            score = sum(scores) / len(scores) if scores else 0.0
+            ram_mb = estimate_ram_bytes(profile, points, dim, args.hnsw_m) / 1024 ** 2
+            print(f"{profile:<12} {score:>18.3f} {percentile_ms(latencies, 50):>8.2f} "
+                  f"{percentile_ms(latencies, 99):>8.2f} {ram_mb:>12.1f}")
+        finally:
+            if not args.keep:
+                client.delete_collection(target)
+
+if __name__ == "__main__":
+    main()
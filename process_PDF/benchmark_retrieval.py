@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from fastembed import TextEmbedding, SparseTextEmbedding
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+from dotenv import load_dotenv
+
+load_dotenv()
+
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "pdf_embeddings")
+SPARSE_MODEL = os.getenv("SPARSE_MODEL", "Qdrant/bm25")
+SPARSE_VECTOR_NAME = os.getenv("SPARSE_VECTOR_NAME", "bm25")
+
+# -----------------------------
+# Helpers
+# -----------------------------
+
+def load_queries(path: str) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def page_key(payload: dict) -> str:
+    metadata = payload.get("metadata", {})
+    return f"{metadata.get('title')}:{metadata.get('page_number')}"
+
+
+def percentile_ms(samples: list[float], q: float) -> float:
+    return float(np.percentile(samples, q) * 1000) if samples else 0.0
+
+
+def run_mode(client: QdrantClient, collection: str, mode: str, dense: list, sparse, k: int, prefetch: int):
+    sparse_vector = models.SparseVector(indices=sparse.indices.tolist(), values=sparse.values.tolist()) if sparse is not None else None
+    if mode == "dense":
+        return client.query_points(collection, query=dense, limit=k, with_payload=True).points
+    if mode == "exact":
+        return client.query_points(collection, query=dense, limit=k, with_payload=True,
+                                   search_params=models.SearchParams(exact=True)).points
+    if mode == "sparse":
+        return client.query_points(collection, query=sparse_vector, using=SPARSE_VECTOR_NAME, limit=k, with_payload=True).points
+    return client.query_points(
+        collection,
+        prefetch=[
+            models.Prefetch(query=dense, limit=prefetch),
+            models.Prefetch(query=sparse_vector, using=SPARSE_VECTOR_NAME, limit=prefetch),
+        ],
+        query=models.FusionQuery(fusion=models.Fusion.RRF),
+        limit=k,
+        with_payload=True
+    ).points
+
+# -----------------------------
+# Main
+# -----------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare recall and latency of dense, sparse and hybrid retrieval")
+    parser.add_argument("--queries", default=os.path.join(os.path.dirname(__file__), "queries.txt"), help="One query per line")
+    parser.add_argument("--qrels", default=None,
+                        help="Optional JSON {query: [\"<title>:<page>\", ...]} of relevant pages. "
+                             "Without it, results are compared with an exact dense search.")
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    parser.add_argument("--host", default=QDRANT_HOST)
+    parser.add_argument("--port", type=int, default=QDRANT_PORT)
+    parser.add_argument("-k", type=int, default=3, help="Results per query (default: 3, as in ask_bh_assurance)")
+    parser.add_argument("--prefetch", type=int, default=20, help="Candidates per branch before fusion (default: 20)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query (default: 5)")
+    parser.add_argument("--modes", default="dense,sparse,hybrid")
+    args = parser.parse_args()
+
+    client = QdrantClient(host=args.host, port=args.port)
+    queries = load_queries(args.queries)
+    qrels = None
+    if args.qrels:
+        with open(args.qrels, encoding="utf-8") as f:
+            qrels = {q: set(pages) for q, pages in json.load(f).items()}
+
+    modes = args.modes.split(",")
+    # Query embeddings are computed up front: the timings below are Qdrant round trips only
+    dense_vectors = [v.tolist() for v in TextEmbedding().embed(queries)]
+    sparse_vectors = [None] * len(queries)
+    if any(m in ("sparse", "hybrid") for m in modes):
+        sparse_vectors = list(SparseTextEmbedding(model_name=SPARSE_MODEL).query_embed(queries))
+
+    references = []
+    for i, query in enumerate(queries):
+        if qrels is not None:
+            references.append(qrels.get(query, set()))
+        else:
+            hits = run_mode(client, args.collection, "exact", dense_vectors[i], None, args.k, args.prefetch)
+            references.append({page_key(h.payload) for h in hits})
+
+    label = "recall" if qrels is not None else "overlap_exact"
+    print(f"{'mode':<8} {label + '@' + str(args.k):>18} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in modes:
+        latencies, scores = [], []
+        for i, query in enumerate(queries):
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                hits = run_mode(client, args.collection, mode, dense_vectors[i], sparse_vectors[i], args.k, args.prefetch)
+                latencies.append(time.perf_counter() - start)
+            if references[i]:
+                found = {page_key(h.payload) for h in hits}
+                scores.append(len(found & references[i]) / len(references[i]))
+        score = sum(scores) / len(scores) if scores else 0.0
+        print(f"{mode:<8} {score:>18.3f} {percentile_ms(latencies, 50):>8.2f} {percentile_ms(latencies, 99):>8.2f}")
+
+if __name__ == "__main__":
+    main()
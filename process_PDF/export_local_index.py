@@ -0,0 +1,87 @@
+import os
+import sys
+import argparse
+import numpy as np
+from qdrant_client import QdrantClient
+from dotenv import load_dotenv
+
+# Run as a script from the repository root: make the app modules importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from payload_store import PayloadStore
+from load_to_qdrant import dense_vector
+
+load_dotenv()
+
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "pdf_embeddings")
+# Same defaults as final_agent.py, relative to the repository root
+FAISS_INDEX_FILE = os.getenv("FAISS_INDEX_FILE", "process_PDF/embeddings.index")
+VECTORS_FILE = os.getenv("VECTORS_FILE", "process_PDF/embeddings.npy")
+METADATA_FILE = os.getenv("METADATA_FILE", "process_PDF/metadata.jsonl")
+
+# -----------------------------
+# Export
+# -----------------------------
+
+# Fields the app reads from a hit (RETRIEVAL_PAYLOAD in retrieval.py)
+PAYLOAD_FIELDS = ["text", "title", "page", "content"]
+
+
+def scroll_collection(client: QdrantClient, collection: str, batch_size: int = 512) -> tuple[np.ndarray, list[dict]]:
+    vectors, payloads, offset = [], [], None
+    while True:
+        batch, offset = client.scroll(collection, limit=batch_size, offset=offset,
+                                      with_payload=PAYLOAD_FIELDS, with_vectors=True)
+        for point in batch:
+            vectors.append(dense_vector(point.vector))
+            payloads.append(point.payload)
+        if offset is None:
+            break
+    if not vectors:
+        raise SystemExit(f"Collection '{collection}' is empty")
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    return matrix, payloads
+
+
+def write_atomic(path: str, write):
+    # Running workers keep their mapping of the old file until they restart
+    tmp = f"{path}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Qdrant collection to files searched in-process by the app")
+    parser.add_argument("--collection", default=COLLECTION_NAME, help=f"Qdrant collection or alias (default: {COLLECTION_NAME})")
+    parser.add_argument("--host", default=QDRANT_HOST)
+    parser.add_argument("--port", type=int, default=QDRANT_PORT)
+    parser.add_argument("--index-file", default=FAISS_INDEX_FILE, help="FAISS index (RETRIEVER_BACKEND=faiss)")
+    parser.add_argument("--vectors-file", default=VECTORS_FILE, help="NumPy matrix (RETRIEVER_BACKEND=numpy)")
+    parser.add_argument("--metadata-file", default=METADATA_FILE,
+                        help="Payloads, one JSON line per vector row (byte offsets in <file>.offsets.npy)")
+    args = parser.parse_args()
+
+    client = QdrantClient(host=args.host, port=args.port)
+    matrix, payloads = scroll_collection(client, args.collection)
+
+    def save_vectors(path: str):
+        with open(path, "wb") as f:
+            np.save(f, matrix)
+
+    write_atomic(args.vectors_file, save_vectors)
+    PayloadStore.write(args.metadata_file, payloads)
+    try:
+        import faiss
+    except ImportError:
+        print("faiss not installed; skipped the FAISS index (RETRIEVER_BACKEND=numpy still works)", file=sys.stderr)
+    else:
+        index = faiss.IndexFlatIP(matrix.shape[1])
+        index.add(matrix)
+        write_atomic(args.index_file, lambda path: faiss.write_index(index, path))
+
+    print(f"Exported {len(payloads)} vectors of dimension {matrix.shape[1]} from '{args.collection}'")
+
+if __name__ == "__main__":
+    main()
@@ -1,89 +1,597 @@
 import os
+import re
+import sys
+import glob
+import queue
+import hashlib
+import threading
+import time
 import uuid
-import json
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-import numpy as np
-from fastembed import TextEmbedding
+from typing import Iterator
+from fastembed import TextEmbedding, SparseTextEmbedding
 from PyPDF2 import PdfReader
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from dotenv import load_dotenv
+# Run as a script from the repository root: make the app modules importable
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+from taxonomy import Taxonomy, TAXONOMY_FIELDS, TAXONOMY_SOURCE, read_taxonomy
+from text_utils import SENTENCE_SPLIT_RE, count_tokens, clean_content
+try:
+    from tqdm import tqdm
+except ImportError:  # fallback if not installed
+    def tqdm(iterable, **kwargs):
+        return iterable
 
+load_dotenv()
 
 # Qdrant Configuration
-QDRANT_HOST = "localhost"
-QDRANT_PORT = 6333
-COLLECTION_NAME = "pdf_embeddings"
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "pdf_embeddings")
+# Answers cached by the app for the previous corpus (see semantic_cache.py)
+SEMANTIC_CACHE_COLLECTION = os.getenv("SEMANTIC_CACHE_COLLECTION", "response_cache")
+# Sparse vectors for hybrid retrieval (see retrieval.py)
+SPARSE_MODEL = os.getenv("SPARSE_MODEL", "Qdrant/bm25")
+SPARSE_VECTOR_NAME = os.getenv("SPARSE_VECTOR_NAME", "bm25")
+# HNSW graph settings for the quantized profiles (Qdrant defaults: m=16, ef_construct=100)
+HNSW_M = int(os.getenv("QDRANT_HNSW_M", 16))
+HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", 200))
 
-# Initialize Qdrant client
-client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
+# Headings of the conditions générales ("ARTICLE 12 - ...", "CHAPITRE II", all-caps titles)
+SECTION_RE = re.compile(r"^\s*((?:ARTICLE|Article|CHAPITRE|Chapitre|TITRE|Titre|SECTION|Section)\b.*|[A-ZÀ-Ý0-9 '’\-]{6,80})\s*$")
 
-# Initialize embedding model
-embedding_model = TextEmbedding()
-test_embedding = list(embedding_model.embed(["test"]))[0]
-embedding_dim = len(test_embedding)
-
-# Ensure collection exists (create if not)
-client.recreate_collection(
-    collection_name=COLLECTION_NAME,
-    vectors_config=models.VectorParams(size=embedding_dim, distance=models.Distance.COSINE)
-)
+# -----------------------------
+# Extraction
+# -----------------------------
 
 def extract_text_from_pdf(pdf_path: str) -> list[dict]:
     """Extract text from PDF page by page."""
     try:
         reader = PdfReader(pdf_path)
-        pages = []
-        for i, page in enumerate(reader.pages):
-            page_text = page.extract_text()
-            if not page_text:
-                continue
-            pages.append({
-                "page_number": i + 1,
-                "content": page_text
-            })
-        return pages
+        return extract_page_range(pdf_path, 0, len(reader.pages), reader)
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}")
 
-def store_pdf_embeddings_in_qdrant(pdf_path: str):
-    """Generate embeddings for PDF and store in Qdrant."""
+
+def extract_page_range(pdf_path: str, first: int, last: int, reader: PdfReader | None = None) -> list[dict]:
+    """Extract pages [first, last) of a PDF; runs in the extraction process pool."""
+    reader = reader or PdfReader(pdf_path)
+    pages = []
+    for i in range(first, last):
+        page_text = reader.pages[i].extract_text()
+        if not page_text:
+            continue
+        pages.append({
+            "page_number": i + 1,
+            "content": page_text
+        })
+    return pages
+
+
+def source_key(pdf_path: str) -> str:
+    """
+    The `source` of a document's points: its path relative to the repository root,
+    whichever way it was given (./process_PDF/x.pdf, an absolute path, a directory).
+    Point ids and incremental runs are keyed on it.
+    """
+    return os.path.relpath(os.path.abspath(pdf_path), REPO_ROOT).replace(os.sep, "/")
+
+
+def expand_sources(patterns: list[str]) -> list[str]:
+    """Resolve files, directories (searched recursively) and glob patterns to a sorted list of PDFs."""
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            found.update(glob.glob(os.path.join(pattern, "**", "*.pdf"), recursive=True))
+        elif glob.has_magic(pattern):
+            found.update(glob.glob(pattern, recursive=True))
+        else:
+            found.add(pattern)
+    # One entry per file, however many spellings of it were given
+    return sorted({os.path.relpath(os.path.abspath(path)) for path in found})
+
+
+def _collect_document(pdf_path: str, futures) -> tuple[str, list[dict] | Exception]:
+    if isinstance(futures, Exception):
+        return pdf_path, futures
     try:
-        pages = extract_text_from_pdf(pdf_path)
-
-        for page in pages:
-            embedding = list(embedding_model.embed([page["content"]]))[0]
-
-            payload = {
-                "id": str(uuid.uuid4()),
-                "content": page["content"],
-                "source": pdf_path,
-                "metadata": {
-                    "title": os.path.basename(pdf_path),
-                    "page_number": page["page_number"],
-                    "crawl_date": datetime.now().isoformat()
-                }
-            }
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+        return pdf_path, pages
+    except Exception as e:
+        return pdf_path, Exception(f"Error extracting text from PDF: {str(e)}")
+
 
-            client.upsert(
-                collection_name=COLLECTION_NAME,
-                points=[
-                    models.PointStruct(
-                        id=payload["id"],
-                        vector=embedding,
-                        payload=payload
-                    )
+def extract_documents(pdf_paths: list[str], workers: int, pages_per_task: int,
+                      max_pending_tasks: int) -> Iterator[tuple[str, list[dict] | Exception]]:
+    """
+    Extract many PDFs in a process pool, split across files and page ranges.
+    Documents are yielded whole and in input order. At most `max_pending_tasks`
+    page ranges are queued ahead of the consumer, which bounds memory.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight: deque = deque()
+        pending = 0
+        for pdf_path in pdf_paths:
+            try:
+                n_pages = len(PdfReader(pdf_path).pages)
+                futures = [
+                    pool.submit(extract_page_range, pdf_path, first, min(first + pages_per_task, n_pages))
+                    for first in range(0, n_pages, pages_per_task)
                 ]
-            )
-            print(f"Stored embeddings for page {page['page_number']} of {pdf_path}")
+                pending += len(futures)
+            except Exception as e:
+                futures = Exception(f"Error extracting text from PDF: {str(e)}")
+            in_flight.append((pdf_path, futures))
+            while pending >= max_pending_tasks and in_flight:
+                path, done = in_flight.popleft()
+                pending -= len(done) if isinstance(done, list) else 0
+                yield _collect_document(path, done)
+        while in_flight:
+            yield _collect_document(*in_flight.popleft())
 
-        print(f"✅ Successfully stored all pages of {pdf_path} in Qdrant collection '{COLLECTION_NAME}'")
+# -----------------------------
+# Chunking
+# -----------------------------
 
-    except Exception as e:
-        print(f"Error processing PDF: {str(e)}")
+def _bounded_pieces(sentence: str, max_tokens: int) -> list[str]:
+    """Break a sentence longer than the chunk budget on word boundaries."""
+    if count_tokens(sentence) <= max_tokens:
+        return [sentence]
+    pieces, words, size = [], [], 0
+    for word in sentence.split():
+        n = count_tokens(word)
+        if words and size + n > max_tokens:
+            pieces.append(" ".join(words))
+            words, size = [], 0
+        words.append(word)
+        size += n
+    if words:
+        pieces.append(" ".join(words))
+    return pieces
 
-# Example usage
-if __name__ == "__main__":
-    pdf_path = 'process_PDF/BH_TOUS_CG.pdf'
-    store_pdf_embeddings_in_qdrant(pdf_path)
 
+def split_into_chunks(pages: list[dict], max_tokens: int, overlap_tokens: int) -> list[dict]:
+    """
+    Split pages into overlapping, token-bounded chunks of whole sentences.
+    Each chunk keeps its page number, its index within the page and the last
+    section heading seen before it.
+    """
+    chunks = []
+    section = None
+    for page in pages:
+        sentences = []
+        for line in page["content"].split("\n"):
+            heading = SECTION_RE.match(line)
+            if heading and count_tokens(line) > 1:
+                section = heading.group(1).strip()
+            for s in SENTENCE_SPLIT_RE.split(line):
+                if s.strip():
+                    sentences.extend(_bounded_pieces(s.strip(), max_tokens))
+
+        window: list[str] = []
+        window_tokens = 0
+        chunk_index = 0
+        chunk_section = section
+
+        def flush():
+            nonlocal chunk_index
+            chunks.append({
+                "content": " ".join(window),
+                "page_number": page["page_number"],
+                "chunk_index": chunk_index,
+                "section": chunk_section,
+            })
+            chunk_index += 1
+
+        for sentence in sentences:
+            n = count_tokens(sentence)
+            if window and window_tokens + n > max_tokens:
+                flush()
+                # Carry the tail of the previous chunk over as overlap
+                carried, carried_tokens = [], 0
+                for prev in reversed(window):
+                    t = count_tokens(prev)
+                    if carried_tokens + t > overlap_tokens:
+                        break
+                    carried.insert(0, prev)
+                    carried_tokens += t
+                while carried and carried_tokens + n > max_tokens:
+                    carried_tokens -= count_tokens(carried.pop(0))
+                window, window_tokens = carried, carried_tokens
+                chunk_section = section
+            window.append(sentence)
+            window_tokens += n
+        if window:
+            flush()
+    return chunks
+
+# -----------------------------
+# Loading logic
+# -----------------------------
+
+def collection_or_alias_exists(client: QdrantClient, name: str) -> bool:
+    if client.collection_exists(name):
+        return True
+    return any(a.alias_name == name for a in client.get_aliases().aliases)
+
+
+# Storage profiles for the dense vectors: (float32 vectors on disk, quantization).
+# Quantized copies are always kept in RAM; searches rescore the best candidates
+# with the original vectors (see QDRANT_RESCORE in retrieval.py).
+PROFILES = {
+    # float32 vectors and HNSW graph in RAM, as before
+    "default": (False, None),
+    # int8 copy (4x smaller) used for the graph search, float32 kept in RAM for rescoring
+    "int8": (False, "int8"),
+    # int8 copy in RAM, float32 vectors memory-mapped from disk: the RAM-saving profile
+    "int8-disk": (True, "int8"),
+    # 1 bit per dimension (32x smaller); needs a larger oversampling to keep recall
+    "binary-disk": (True, "binary"),
+}
+
+
+def collection_profile(profile: str, m: int = HNSW_M, ef_construct: int = HNSW_EF_CONSTRUCT) -> dict:
+    """Vector, HNSW and quantization settings of a storage profile."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile '{profile}', expected one of {', '.join(PROFILES)}")
+    on_disk, quantization = PROFILES[profile]
+    quantization_config = None
+    if quantization == "int8":
+        quantization_config = models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    elif quantization == "binary":
+        quantization_config = models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return {
+        "on_disk": on_disk,
+        "hnsw_config": models.HnswConfigDiff(m=m, ef_construct=ef_construct) if profile != "default" else None,
+        "quantization_config": quantization_config,
+    }
+
+
+def apply_profile(client: QdrantClient, collection: str, profile: str, m: int = HNSW_M,
+                  ef_construct: int = HNSW_EF_CONSTRUCT):
+    """Switch an existing collection to a profile; Qdrant rebuilds its segments in the background."""
+    config = collection_profile(profile, m, ef_construct)
+    client.update_collection(
+        collection_name=collection,
+        vectors_config={"": models.VectorParamsDiff(on_disk=config["on_disk"])},
+        hnsw_config=config["hnsw_config"],
+        quantization_config=config["quantization_config"] or models.Disabled.DISABLED,
+    )
+
+
+def ensure_collection(client: QdrantClient, collection: str, dim: int, recreate: bool, hybrid: bool = False,
+                      profile: str | None = None, m: int = HNSW_M, ef_construct: int = HNSW_EF_CONSTRUCT):
+    if recreate or not collection_or_alias_exists(client, collection):
+        config = collection_profile(profile or "default", m, ef_construct)
+        client.recreate_collection(
+            collection_name=collection,
+            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE, on_disk=config["on_disk"]),
+            sparse_vectors_config={
+                SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)
+            } if hybrid else None,
+            hnsw_config=config["hnsw_config"],
+            quantization_config=config["quantization_config"]
+        )
+    else:
+        if hybrid:
+            sparse = client.get_collection(collection).config.params.sparse_vectors or {}
+            if SPARSE_VECTOR_NAME not in sparse:
+                raise SystemExit(
+                    f"Collection '{collection}' has no '{SPARSE_VECTOR_NAME}' sparse vectors. "
+                    "Rebuild it with --hybrid --shadow (or --recreate)."
+                )
+        if profile is not None:
+            apply_profile(client, collection, profile, m, ef_construct)
+    # Incremental runs look points up by source; title, page and the taxonomy tags are the filterable fields of a hit
+    for field_name, field_schema in (("source", models.PayloadSchemaType.KEYWORD),
+                                     ("title", models.PayloadSchemaType.KEYWORD),
+                                     ("page", models.PayloadSchemaType.INTEGER),
+                                     *((field, models.PayloadSchemaType.KEYWORD) for field in TAXONOMY_FIELDS)):
+        client.create_payload_index(
+            collection_name=collection,
+            field_name=field_name,
+            field_schema=field_schema
+        )
+
+
+def dense_vector(vector):
+    # Hybrid collections return {"": dense, SPARSE_VECTOR_NAME: sparse}
+    return vector.get("") if isinstance(vector, dict) else vector
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_point_id(source: str, chunk: dict) -> str:
+    """Deterministic id: the same chunk text at the same place always maps to the same point."""
+    key = f"{source}:{chunk['page_number']}:{chunk['chunk_index']}:{chunk['content_hash']}"
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+def existing_points(client: QdrantClient, collection: str, source: str) -> dict[str, dict]:
+    """Point id -> taxonomy tags of the points already stored for a source."""
+    points_tags: dict[str, dict] = {}
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            scroll_filter=models.Filter(must=[
+                models.FieldCondition(key="source", match=models.MatchValue(value=source))
+            ]),
+            with_payload=list(TAXONOMY_FIELDS),
+            with_vectors=False,
+            limit=1024,
+            offset=offset
+        )
+        for p in points:
+            points_tags[str(p.id)] = {field: p.payload.get(field) for field in TAXONOMY_FIELDS}
+        if offset is None:
+            return points_tags
+
+
+def prune_removed_sources(client: QdrantClient, collection: str, keep_sources: set[str]) -> int:
+    """Delete the points of every source that is no longer part of the corpus."""
+    stale: list[str] = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            with_payload=["source"],
+            with_vectors=False,
+            limit=1024,
+            offset=offset
+        )
+        stale.extend(str(p.id) for p in points if p.payload.get("source") not in keep_sources)
+        if offset is None:
+            break
+    if stale:
+        client.delete(collection_name=collection, points_selector=models.PointIdsList(points=stale), wait=True)
+    return len(stale)
+
+
+def swap_alias(client: QdrantClient, alias: str, new_collection: str):
+    """Point `alias` at `new_collection` atomically and drop the collection it used to serve."""
+    previous = [a.collection_name for a in client.get_aliases().aliases if a.alias_name == alias]
+    if client.collection_exists(alias):
+        # Legacy layout: a physical collection owns the name. It has to go before
+        # the alias can take over (one-off, only on the first shadow build).
+        print(f"Replacing physical collection '{alias}' by an alias")
+        client.delete_collection(collection_name=alias)
+    operations = [models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=alias))] if previous else []
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=new_collection, alias_name=alias)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    for old in previous:
+        if old != new_collection:
+            client.delete_collection(collection_name=old)
+
+
+def build_points(chunks: list[dict], vectors, sparse_vectors=None) -> Iterator[models.PointStruct]:
+    crawl_date = datetime.now().isoformat()
+    sparse_vectors = sparse_vectors if sparse_vectors is not None else [None] * len(chunks)
+    for chunk, vector, sparse in zip(chunks, vectors, sparse_vectors):
+        # Top-level text/title/page are what searches fetch (see RETRIEVAL_PAYLOAD in retrieval.py)
+        payload = {
+            "id": chunk["id"],
+            # Cleaned once at ingest instead of per search hit
+            "text": clean_content(chunk["content"]),
+            "title": os.path.basename(chunk["source"]),
+            "page": chunk["page_number"],
+            "content_hash": chunk["content_hash"],
+            "source": chunk["source"],
+            "metadata": {
+                "title": os.path.basename(chunk["source"]),
+                "page_number": chunk["page_number"],
+                "chunk_index": chunk["chunk_index"],
+                "section": chunk["section"],
+                "crawl_date": crawl_date
+            }
+        }
+        payload.update(chunk.get("tags", {}))
+        if sparse is None:
+            point_vector = vector.tolist()
+        else:
+            point_vector = {
+                "": vector.tolist(),
+                SPARSE_VECTOR_NAME: models.SparseVector(indices=sparse.indices.tolist(), values=sparse.values.tolist()),
+            }
+        yield models.PointStruct(id=payload["id"], vector=point_vector, payload=payload)
+
+
+def plan_document(client: QdrantClient, pdf_path: str, pages: list[dict], args: argparse.Namespace,
+                  taxonomy: Taxonomy | None = None) -> tuple[list[dict], list[str], dict[str, dict], int]:
+    """
+    Chunk a document and diff it against what Qdrant already holds for it.
+    Returns the new or changed chunks to embed (tagged with the taxonomy if given),
+    the stale point ids to delete, the new tags of unchanged points whose tags
+    differ (the text did not change but the taxonomy did) and the total number of chunks.
+    """
+    source = source_key(pdf_path)
+    chunks = split_into_chunks(pages, args.chunk_tokens, args.chunk_overlap)
+    for chunk in chunks:
+        chunk["source"] = source
+        chunk["content_hash"] = content_hash(chunk["content"])
+        chunk["id"] = chunk_point_id(source, chunk)
+    existing = existing_points(client, args.collection, source)
+    wanted = {c["id"] for c in chunks}
+    to_upload = [c for c in chunks if c["id"] not in existing]
+    to_delete = list(existing.keys() - wanted)
+    to_retag: dict[str, dict] = {}
+    if taxonomy:
+        for chunk in chunks:
+            chunk["tags"] = taxonomy.tags(chunk["content"])
+            if chunk["id"] in existing and existing[chunk["id"]] != chunk["tags"]:
+                to_retag[chunk["id"]] = chunk["tags"]
+    return to_upload, to_delete, to_retag, len(chunks)
+
+
+def retag_points(client: QdrantClient, collection: str, to_retag: dict[str, dict]):
+    """Overwrite the taxonomy tags of unchanged points in one batched request."""
+    client.batch_update_points(
+        collection_name=collection,
+        update_operations=[
+            models.SetPayloadOperation(set_payload=models.SetPayload(payload=tags, points=[point_id]))
+            for point_id, tags in to_retag.items()
+        ],
+        wait=True
+    )
+
+
+def upload_chunks(client: QdrantClient, embedding_model: TextEmbedding, chunks: list[dict],
+                  args: argparse.Namespace, progress: bool = True, sparse_model: SparseTextEmbedding | None = None):
+    """Embed a buffer of chunks (possibly from several documents) in one batched call and bulk-upload them."""
+    texts = [c["content"] for c in chunks]
+    vectors = embedding_model.embed(texts, batch_size=args.batch_size, parallel=args.parallel)
+    sparse_vectors = None
+    if sparse_model is not None:
+        sparse_vectors = sparse_model.embed(texts, batch_size=args.batch_size, parallel=args.parallel)
+    client.upload_points(
+        collection_name=args.collection,
+        points=tqdm(build_points(chunks, vectors, sparse_vectors), total=len(chunks), desc="Embedding + upload", disable=not progress),
+        batch_size=args.upload_batch_size,
+        wait=True
+    )
+
+# -----------------------------
+# Main
+# -----------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk, embed and sync PDF documents into Qdrant")
+    parser.add_argument("pdfs", nargs="*", default=["process_PDF/BH_TOUS_CG.pdf"],
+                        help="PDF files, directories or glob patterns to load (default: process_PDF/BH_TOUS_CG.pdf)")
+    parser.add_argument("--collection", default=COLLECTION_NAME, help=f"Qdrant collection or alias (default: {COLLECTION_NAME})")
+    parser.add_argument("--host", default=QDRANT_HOST)
+    parser.add_argument("--port", type=int, default=QDRANT_PORT)
+    parser.add_argument("--chunk-tokens", type=int, default=256, help="Maximum tokens per chunk (default: 256)")
+    parser.add_argument("--chunk-overlap", type=int, default=48, help="Tokens carried over between consecutive chunks (default: 48)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Embedding batch size (default: 256)")
+    parser.add_argument("--parallel", type=int, default=None, help="Embedding worker processes (0 = all cores, default: single process)")
+    parser.add_argument("--upload-batch-size", type=int, default=256, help="Points per Qdrant upload request (default: 256)")
+    parser.add_argument("--flush-size", type=int, default=2048, help="Chunks buffered across documents before an embedding pass (default: 2048)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="PDF extraction processes (default: all cores)")
+    parser.add_argument("--pages-per-task", type=int, default=16, help="Pages extracted per process-pool task (default: 16)")
+    parser.add_argument("--queue-size", type=int, default=4, help="Extracted documents buffered ahead of the embedder (default: 4)")
+    parser.add_argument("--hybrid", action="store_true", help=f"Also index {SPARSE_MODEL} sparse vectors for hybrid retrieval")
+    parser.add_argument("--profile", choices=list(PROFILES), default=None,
+                        help="Vector storage profile; applied on creation, or in place to an existing collection "
+                             "(default: keep the existing one, 'default' for new collections)")
+    parser.add_argument("--hnsw-m", type=int, default=HNSW_M, help=f"HNSW links per node for quantized profiles (default: {HNSW_M})")
+    parser.add_argument("--hnsw-ef-construct", type=int, default=HNSW_EF_CONSTRUCT,
+                        help=f"HNSW build-time candidate list for quantized profiles (default: {HNSW_EF_CONSTRUCT})")
+    parser.add_argument("--taxonomy", choices=["neo4j", "excel", "none"], default=TAXONOMY_SOURCE,
+                        help="Source of the KG branches/products/guarantees tagging the chunks; keep it the app's "
+                             f"TAXONOMY_SOURCE (default: {TAXONOMY_SOURCE})")
+    parser.add_argument("--prune", action="store_true", help="Delete the points of sources not listed in this run")
+    parser.add_argument("--recreate", action="store_true", help="Drop and recreate the collection in place before loading")
+    parser.add_argument("--shadow", action="store_true",
+                        help="Build a fresh collection and swap it in behind the --collection alias once complete")
+    parser.add_argument("--no-progress", action="store_true", help="Disable tqdm progress bars")
+    args = parser.parse_args()
+    progress = not args.no_progress
+
+    pdf_paths = expand_sources(args.pdfs)
+    if not pdf_paths:
+        raise SystemExit(f"No PDF found for {args.pdfs}")
+
+    client = QdrantClient(host=args.host, port=args.port)
+    embedding_model = TextEmbedding()
+    embedding_dim = len(list(embedding_model.embed(["test"]))[0])
+    sparse_model = SparseTextEmbedding(model_name=SPARSE_MODEL) if args.hybrid else None
+    taxonomy = read_taxonomy(args.taxonomy)
+    if taxonomy is None:
+        print("No taxonomy; chunks will not be tagged")
+
+    alias = args.collection
+    if args.shadow:
+        args.collection = f"{alias}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        print(f"Building shadow collection '{args.collection}'")
+    ensure_collection(client, args.collection, embedding_dim, args.recreate, args.hybrid,
+                      args.profile, args.hnsw_m, args.hnsw_ef_construct)
+
+    # Extraction runs ahead in a producer thread; the bounded queue blocks it
+    # (back-pressure) whenever embedding falls behind.
+    documents: queue.Queue = queue.Queue(maxsize=args.queue_size)
+
+    def produce():
+        for item in extract_documents(pdf_paths, args.workers, args.pages_per_task, args.workers * 4):
+            documents.put(item)
+        documents.put(None)
+
+    start = time.perf_counter()
+    threading.Thread(target=produce, daemon=True).start()
+
+    totals = {"documents": 0, "pages": 0, "chunks": 0, "added": 0, "deleted": 0, "retagged": 0}
+    failed = False
+    buffer: list[dict] = []
+    # Stale ids of the buffered documents: deleted only once their replacements are uploaded,
+    # so changed pages never go missing from the live collection
+    pending_deletes: list[str] = []
+
+    def flush():
+        if buffer:
+            upload_chunks(client, embedding_model, buffer, args, progress, sparse_model)
+        if pending_deletes:
+            client.delete(collection_name=args.collection, points_selector=models.PointIdsList(points=pending_deletes), wait=True)
+        buffer.clear()
+        pending_deletes.clear()
+
+    for pdf_path, pages in tqdm(iter(documents.get, None), total=len(pdf_paths), desc="Documents", disable=not progress):
+        if isinstance(pages, Exception):
+            print(f"Error processing PDF {pdf_path}: {str(pages)}")
+            failed = True
+            continue
+        to_upload, to_delete, to_retag, n_chunks = plan_document(client, pdf_path, pages, args, taxonomy)
+        if to_retag:
+            retag_points(client, args.collection, to_retag)
+        buffer.extend(to_upload)
+        pending_deletes.extend(to_delete)
+        if len(buffer) >= args.flush_size:
+            flush()
+        totals["documents"] += 1
+        totals["pages"] += len(pages)
+        totals["chunks"] += n_chunks
+        totals["added"] += len(to_upload)
+        totals["deleted"] += len(to_delete)
+        totals["retagged"] += len(to_retag)
+        print(f"✅ {pdf_path}: {len(pages)} pages, {n_chunks} chunks, {len(to_upload)} new, {len(to_delete)} deleted, "
+              f"{len(to_retag)} retagged")
+    flush()
+
+    if args.prune and not failed:
+        pruned = prune_removed_sources(client, args.collection, {source_key(p) for p in pdf_paths})
+        totals["deleted"] += pruned
+        print(f"Pruned {pruned} points from removed sources")
+
+    elapsed = time.perf_counter() - start
+    print(f"Synced {totals['documents']} documents ({totals['pages']} pages, {totals['chunks']} chunks) into "
+          f"'{args.collection}': {totals['added']} added, {totals['deleted']} deleted in {elapsed:.1f}s "
+          f"({totals['pages'] / elapsed if elapsed else 0.0:.1f} pages/s, "
+          f"{totals['added'] / elapsed if elapsed else 0.0:.1f} chunks embedded/s)")
+
+    if args.shadow:
+        if failed:
+            print(f"Some PDFs failed; leaving '{alias}' untouched. Shadow collection kept for inspection: '{args.collection}'")
+            return
+        swap_alias(client, alias, args.collection)
+        print(f"Alias '{alias}' now serves '{args.collection}'")
+
+    if totals["added"] or totals["deleted"] or totals["retagged"]:
+        # Cached answers were generated from the old context
+        client.delete_collection(collection_name=SEMANTIC_CACHE_COLLECTION)
+        print(f"Invalidated semantic cache collection '{SEMANTIC_CACHE_COLLECTION}'")
+
+if __name__ == "__main__":
+    main()
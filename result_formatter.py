@@ -0,0 +1,130 @@
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Bigger results, or nested values (whole nodes, lists), are phrased by the LLM
+RESULT_FORMAT_MAX_ROWS = int(os.getenv("RESULT_FORMAT_MAX_ROWS", 20))
+RESULT_FORMAT_MAX_FIELDS = int(os.getenv("RESULT_FORMAT_MAX_FIELDS", 6))
+# Records shown to the LLM when it does format a result
+RESULT_LLM_MAX_ROWS = int(os.getenv("RESULT_LLM_MAX_ROWS", 30))
+
+NO_RESULT_ANSWER = ("Non, aucun résultat correspondant n'a été trouvé. "
+                    "Vérifiez le numéro ou l'identifiant indiqué, ou reformulez la question.")
+
+# Amounts of the KG, in Tunisian dinars (see the schema in final_agent.py)
+MONEY_FIELDS = {"capital_assure", "somme_quittances", "montant_encaisse", "montant_a_encaisser"}
+FIELD_LABELS = {
+    "num_contrat": "Contrat n°",
+    "num_sinistre": "Sinistre n°",
+    "ref_personne": "Réf. client",
+    "client": "Client",
+    "nom_prenom": "Nom",
+    "raison_sociale": "Raison sociale",
+    "matricule_fiscale": "Matricule fiscale",
+    "produit": "Produit",
+    "lib_produit": "Produit",
+    "garantie": "Garantie",
+    "lib_garantie": "Garantie",
+    "description": "Description",
+    "etat": "État",
+    "lib_etat_contrat": "État du contrat",
+    "lib_etat_sinistre": "État du sinistre",
+    "type": "Type",
+    "lib_type_sinistre": "Type de sinistre",
+    "statut_paiement": "Statut de paiement",
+    "capital_assure": "Capital assuré",
+    "somme_quittances": "Somme des quittances",
+    "montant_encaisse": "Montant encaissé",
+    "montant_a_encaisser": "Montant à encaisser",
+    "couvert": "Couvert",
+    "effet_contrat": "Date d'effet",
+    "date_expiration": "Date d'expiration",
+    "prochain_terme": "Prochain terme",
+    "date_survenance": "Date de survenance",
+    "date_declaration": "Date de déclaration",
+}
+# What a list of records is about, from the identifying column it carries: (column, plural, "trouvé(e)s")
+ENTITY_NAMES = [("num_sinistre", "sinistres", "trouvés"), ("num_contrat", "contrats", "trouvés"),
+                ("garantie", "garanties", "trouvées"), ("lib_garantie", "garanties", "trouvées"),
+                ("ref_personne", "clients", "trouvés")]
+ISO_DATE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+
+
+def format_number(number, decimals: int = 3) -> str:
+    """1234567.5 -> "1 234 567,5": fixed-point, French separators, no trailing zeros."""
+    value = f"{float(number):,.{decimals}f}".replace(",", " ").replace(".", ",")
+    if "," in value:
+        value = value.rstrip("0").rstrip(",")
+    return "0" if value == "-0" else value
+
+
+def format_tnd(amount) -> str:
+    """12345.5 -> "12 345,500 TND" (millimes shown only when there are some)."""
+    value = f"{float(amount):,.3f}".replace(",", " ").replace(".", ",")
+    if value.endswith(",000"):
+        value = value[:-4]
+    return f"{value} TND"
+
+
+def _label(field: str) -> str:
+    return FIELD_LABELS.get(field, field.replace("_", " ").capitalize())
+
+
+def format_value(field: str, value) -> str:
+    if value is None:
+        return "non renseigné"
+    if isinstance(value, bool):
+        return "Oui" if value else "Non"
+    if field in MONEY_FIELDS and isinstance(value, (int, float)):
+        return format_tnd(value)
+    if hasattr(value, "iso_format"):
+        # neo4j.time.Date / DateTime
+        value = value.iso_format()
+    if isinstance(value, str) and ISO_DATE_RE.match(value[:10]):
+        year, month, day = ISO_DATE_RE.match(value[:10]).groups()
+        return f"{day}/{month}/{year}"
+    if isinstance(value, float):
+        return format_number(value)
+    return str(value)
+
+
+def _is_scalar(value) -> bool:
+    return not isinstance(value, (dict, list, tuple, set))
+
+
+def _row(record: dict) -> str:
+    return ", ".join(f"{_label(k)} : {format_value(k, v)}" for k, v in record.items() if v is not None) or "non renseigné"
+
+
+def format_records(records: list[dict], max_rows: int = RESULT_FORMAT_MAX_ROWS,
+                   max_fields: int = RESULT_FORMAT_MAX_FIELDS) -> str | None:
+    """
+    French answer for the common result shapes: no result, a single value, one
+    record, a list of one field, a short table of flat records. None for the
+    others, which are left to the LLM.
+    """
+    if not records:
+        return NO_RESULT_ANSWER
+    fields = list(records[0].keys())
+    if (len(records) > max_rows or len(fields) > max_fields
+            or any(not _is_scalar(v) for record in records for v in record.values())):
+        return None
+
+    if len(records) == 1:
+        record = records[0]
+        if len(fields) == 1:
+            return f"{_label(fields[0])} : {format_value(fields[0], record[fields[0]])}."
+        return "\n".join(f"- **{_label(k)}** : {format_value(k, v)}" for k, v in record.items())
+
+    entity, found = next(((name, found) for field, name, found in ENTITY_NAMES if field in fields),
+                         ("résultats", "trouvés"))
+    if len(fields) == 1:
+        values = list(dict.fromkeys(format_value(fields[0], r[fields[0]]) for r in records))
+        header = f"{len(values)} {entity} {found} :"
+        if entity == "résultats":
+            header = f"{len(values)} {entity} {found} ({_label(fields[0]).lower()}) :"
+        return header + "\n" + "\n".join(f"- {v}" for v in values)
+    header = f"{len(records)} {entity} {found} :"
+    return header + "\n" + "\n".join(f"- {_row(r)}" for r in records)
@@ -0,0 +1,174 @@
+import os
+import numpy as np
+from fastembed import SparseTextEmbedding
+from qdrant_client.http import models
+from dotenv import load_dotenv
+from final_agent import QDRANT_COLLECTION, FAISS_INDEX_FILE, VECTORS_FILE, METADATA_FILE
+from payload_store import PayloadStore
+
+load_dotenv()
+
+# qdrant: search the Qdrant collection over the network.
+# faiss / numpy: search an index exported by process_PDF/export_local_index.py in-process.
+# Prefer numpy for several workers: its vectors are always shared through the page cache,
+# while faiss only maps a flat index from version 1.10 (IO_FLAG_MMAP_IFC) and copies it otherwise.
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "qdrant")
+# Payload fields returned with each hit. `content` only exists on points loaded
+# before the text was stored pre-cleaned; the selector skips it on newer points.
+RETRIEVAL_PAYLOAD = ["text", "title", "page", "content"]
+
+# dense: one vector search. hybrid: dense + sparse (BM25) prefetch fused with RRF in a single query.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+SPARSE_MODEL = os.getenv("SPARSE_MODEL", "Qdrant/bm25")
+SPARSE_VECTOR_NAME = os.getenv("SPARSE_VECTOR_NAME", "bm25")
+RETRIEVAL_PREFETCH = int(os.getenv("RETRIEVAL_PREFETCH", 20))
+# Quantized collections (see --profile in process_PDF/load_to_qdrant.py): search the
+# in-RAM quantized copy, then rescore oversampling * limit candidates with the original vectors.
+# Ignored by collections without quantization.
+QDRANT_RESCORE = os.getenv("QDRANT_RESCORE", "true").lower() == "true"
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", 2.0))
+QDRANT_HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", 0)) or None
+
+
+def initialize_sparse_model():
+    return SparseTextEmbedding(model_name=SPARSE_MODEL)
+
+
+class QdrantRetriever:
+    """
+    Retrieves product passages from the pdf_embeddings collection.
+    `search` returns the payloads of the best hits, most relevant first.
+    """
+
+    def __init__(self, qdrant_client, embedding_service, sparse_embedding_service=None,
+                 collection: str = QDRANT_COLLECTION, mode: str = RETRIEVAL_MODE,
+                 prefetch_limit: int = RETRIEVAL_PREFETCH, rescore: bool = QDRANT_RESCORE,
+                 oversampling: float = QDRANT_OVERSAMPLING, hnsw_ef: int | None = QDRANT_HNSW_EF,
+                 taxonomy=None):
+        if mode == "hybrid" and sparse_embedding_service is None:
+            raise ValueError("Hybrid retrieval needs a sparse embedding service")
+        self.qdrant = qdrant_client
+        self.embedding_service = embedding_service
+        self.sparse_embedding_service = sparse_embedding_service
+        self.collection = collection
+        self.mode = mode
+        self.prefetch_limit = prefetch_limit
+        # Scopes searches to the products/guarantees named in the query (see taxonomy.py)
+        self.taxonomy = taxonomy
+        self.search_params = models.SearchParams(
+            hnsw_ef=hnsw_ef,
+            quantization=models.QuantizationSearchParams(rescore=rescore, oversampling=oversampling)
+        )
+
+    def _query_filter(self, query: str) -> models.Filter | None:
+        # Every kind of label mentioned in the query must be among the chunk's tags
+        tags = self.taxonomy.match(query) if self.taxonomy is not None else {}
+        if not tags:
+            return None
+        return models.Filter(must=[
+            models.FieldCondition(key=field, match=models.MatchAny(any=labels)) for field, labels in tags.items()
+        ])
+
+    async def _search(self, dense: list[float], sparse, query_filter: models.Filter | None, limit: int) -> list[dict]:
+        if sparse is None:
+            hits = await self.qdrant.search(
+                collection_name=self.collection,
+                query_vector=dense,
+                query_filter=query_filter,
+                limit=limit,
+                search_params=self.search_params,
+                with_payload=RETRIEVAL_PAYLOAD
+            )
+            return [hit.payload for hit in hits]
+
+        response = await self.qdrant.query_points(
+            collection_name=self.collection,
+            prefetch=[
+                models.Prefetch(query=dense, filter=query_filter, limit=self.prefetch_limit, params=self.search_params),
+                models.Prefetch(
+                    query=models.SparseVector(indices=sparse.indices.tolist(), values=sparse.values.tolist()),
+                    using=SPARSE_VECTOR_NAME,
+                    filter=query_filter,
+                    limit=self.prefetch_limit
+                ),
+            ],
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            limit=limit,
+            with_payload=RETRIEVAL_PAYLOAD
+        )
+        return [point.payload for point in response.points]
+
+    async def search(self, query: str, limit: int = 3) -> list[dict]:
+        dense = (await self.embedding_service.embed(query)).tolist()
+        sparse = None
+        if self.mode == "hybrid":
+            sparse = await self.sparse_embedding_service.embed(query, use_cache=False)
+
+        query_filter = self._query_filter(query)
+        if query_filter is not None:
+            hits = await self._search(dense, sparse, query_filter, limit)
+            if hits:
+                return hits
+            # Untagged chunks (loaded before tagging) or a label the documents never mention
+        return await self._search(dense, sparse, None, limit)
+
+
+class LocalIndexRetriever:
+    """
+    Retrieves product passages from an index exported from the Qdrant collection,
+    searched in-process with no network hop. Payloads, and the vectors of the numpy
+    backend, are memory-mapped read-only, so gunicorn workers share the same pages
+    through the OS page cache. The faiss backend shares its flat index only with
+    faiss >= 1.10; older versions read a copy into every worker.
+    Dense search only; `search` has the same contract as QdrantRetriever.search.
+    """
+
+    def __init__(self, embedding_service, backend: str = RETRIEVER_BACKEND, index_file: str = FAISS_INDEX_FILE,
+                 vectors_file: str = VECTORS_FILE, metadata_file: str = METADATA_FILE):
+        self.embedding_service = embedding_service
+        self.backend = backend
+        if backend == "faiss":
+            import faiss
+            # IO_FLAG_MMAP only maps IVF inverted lists; flat indexes need IO_FLAG_MMAP_IFC (faiss >= 1.10)
+            mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+            if mmap_flag is None:
+                print(f"faiss {faiss.__version__} cannot memory-map {index_file}: every worker loads its own copy "
+                      "(RETRIEVER_BACKEND=numpy shares it)")
+                self.index = faiss.read_index(index_file)
+            else:
+                self.index = faiss.read_index(index_file, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+            size = self.index.ntotal
+        elif backend == "numpy":
+            # Rows are L2-normalized at export: inner product is cosine similarity
+            self.vectors = np.load(vectors_file, mmap_mode="r")
+            size = self.vectors.shape[0]
+        else:
+            raise ValueError(f"Unknown local retriever backend '{backend}', expected 'faiss' or 'numpy'")
+        # Memory-mapped too: payloads are decoded per hit, not loaded whole by every worker
+        self.payloads = PayloadStore(metadata_file)
+        if len(self.payloads) != size:
+            raise ValueError(f"{metadata_file} has {len(self.payloads)} payloads for {size} vectors; re-run the export")
+
+    def _search_vector(self, query_vector: np.ndarray, limit: int) -> list[int]:
+        query = (query_vector / (np.linalg.norm(query_vector) + 1e-12)).astype(np.float32)
+        if self.backend == "faiss":
+            _, ids = self.index.search(query.reshape(1, -1), limit)
+            return [int(i) for i in ids[0] if i >= 0]
+        scores = self.vectors @ query
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        return top[np.argsort(-scores[top])].tolist()
+
+    async def search(self, query: str, limit: int = 3) -> list[dict]:
+        query_vector = await self.embedding_service.embed(query)
+        # Brute force over a few thousand rows takes well under a millisecond: no executor needed
+        return [self.payloads[i] for i in self._search_vector(query_vector, limit)]
+
+
+def create_retriever(qdrant_client, embedding_service, sparse_embedding_service=None, backend: str = RETRIEVER_BACKEND,
+                     taxonomy=None):
+    if backend == "qdrant":
+        return QdrantRetriever(qdrant_client, embedding_service, sparse_embedding_service, taxonomy=taxonomy)
+    return LocalIndexRetriever(embedding_service, backend)
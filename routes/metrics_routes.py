@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+
+
+def get_metrics_router(embedding_cache, semantic_cache, context_builder, llm_monitor, neo4j_agent):
+    router = APIRouter()
+
+    # Cache statistics, used to size the caches (LRU capacity, TTLs)
+    @router.get("/metrics/embedding-cache")
+    async def embedding_cache_metrics():
+        return embedding_cache.stats()
+
+    @router.get("/metrics/semantic-cache")
+    async def semantic_cache_metrics():
+        return semantic_cache.stats()
+
+    # Prompt sizes sent to Ollama (estimated and as counted by prompt_eval_count)
+    @router.get("/metrics/prompt")
+    async def prompt_metrics():
+        return context_builder.stats()
+
+    # Ollama load and how many product answers fell back to extractive mode
+    @router.get("/metrics/llm")
+    async def llm_metrics():
+        return llm_monitor.stats()
+
+    # Client questions answered by a Cypher template vs. generated by the LLM
+    @router.get("/metrics/cypher")
+    async def cypher_metrics():
+        return neo4j_agent.stats()
+
+    return router
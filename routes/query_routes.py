@@ -1,65 +1,64 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from final_agent import classify_query, ask_bh_assurance, summarize_text  # <- assume you have a function that calls OpenAI
-import json, re
+from typing import Literal
+from final_agent import classify_query, ask_bh_assurance, ask_bh_assurance_stream, answer_extractive, is_fallback_answer, summarize_text  # <- assume you have a function that calls OpenAI
+import json, re, hashlib
 from middleware.jwt_verifier import verify_jwt
 from databases import Database
 from datetime import datetime
-
-last_client_ref = None
-last_client_matricule = None
+from client_context import ClientContext
 
 class QueryRequest(BaseModel):
     query: str
     chat_id: int | None = None  # optional, for existing chats
+    # Product questions: auto = LLM unless Ollama is overloaded, llm / extractive = force one
+    mode: Literal["auto", "llm", "extractive"] = "auto"
 
-def get_query_router(redis_client, embedding_model, neo4j_agent, database: Database, CACHE_TTL_SECONDS: int):
-    router = APIRouter()
+def _sse(data: dict, event: str | None = None) -> str:
+    """Encode one Server-Sent Event frame."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-    @router.post("/query")
-    async def process_query(request: QueryRequest, payload: dict = Depends(verify_jwt)):
-        global last_client_ref, last_client_matricule
-
-        user_id = int(payload["sub"])
-        query_text = request.query.strip()
-        if not query_text:
-            raise HTTPException(status_code=400, detail="Query is required")
-
-        # --- Redis cache ---
-        cached_response = await redis_client.get(query_text)
-        if cached_response:
-            return {"response": json.loads(cached_response)}
+def get_query_router(redis_client, embedding_service, retriever, context_builder, neo4j_agent, clients, semantic_cache, memory, client_contexts, llm_monitor, database: Database, CACHE_TTL_SECONDS: int):
+    router = APIRouter()
 
+    def _prepare_query(query_text: str, context: ClientContext) -> str:
         # --- Extract context ---
         match_ref = re.search(r"client\s*(\d+)", query_text)
         match_mat = re.search(r"matricule\s*fiscale\s*(?:est|=|:)?\s*(\w+)", query_text)
 
         if match_mat:
-            last_client_matricule = match_mat.group(1)
-            neo4j_agent._conversation["person_matricule"] = last_client_matricule
+            context.set_client(matricule=match_mat.group(1))
         elif match_ref:
-            last_client_ref = match_ref.group(1)
-            neo4j_agent._conversation["person_ref"] = last_client_ref
+            context.set_client(ref_personne=match_ref.group(1))
 
         # --- Add context for processing ---
         query_for_agent = query_text
-        if last_client_matricule and "matricule_fiscale" not in query_for_agent:
-            query_for_agent += f" (matricule fiscale est {last_client_matricule})"
-        elif last_client_ref and "ref_personne" not in query_for_agent:
-            query_for_agent += f" (ref_personne est {last_client_ref})"
-
-        # --- Classify and get response ---
-        category = classify_query(query_for_agent)
-        if category == "product":
-            response = await  ask_bh_assurance(query_for_agent, embedding_model)
-        else:
-            response = await neo4j_agent.execute_query(query_for_agent)
-
-        # --- Store in Redis ---
-        await redis_client.setex(query_text, CACHE_TTL_SECONDS, json.dumps(response))
-
+        if context.matricule and "matricule_fiscale" not in query_for_agent:
+            query_for_agent += f" (matricule fiscale est {context.matricule})"
+        elif context.ref_personne and "ref_personne" not in query_for_agent:
+            query_for_agent += f" (ref_personne est {context.ref_personne})"
+        return query_for_agent
+
+    def _use_extractive(mode: str) -> bool:
+        if mode == "extractive":
+            return True
+        return mode == "auto" and llm_monitor.overloaded()
+
+    async def _answer_extractive(query_for_agent: str, mode: str) -> str:
+        response = await answer_extractive(query_for_agent, retriever, embedding_service)
+        llm_monitor.record_extractive(degraded=mode == "auto")
+        return response
+
+    def _answer_key(user_id: int, chat_id: int | None, query_for_agent: str) -> str:
+        # Scoped by user and chat: client answers depend on the chat's client context
+        digest = hashlib.sha1(query_for_agent.encode("utf-8")).hexdigest()
+        return f"answer:{user_id}:{chat_id or 'new'}:{digest}"
+
+    async def _save_answer(user_id: int, chat_id: int | None, query_text: str, query_for_agent: str, response: str,
+                           category: str, context: ClientContext) -> int:
         # --- Handle chat ---
-        chat_id = request.chat_id
         if not chat_id:
             # Generate chat name using the first query
             chat_name = await summarize_text(query_text)  # e.g., call OpenAI API to summarize
@@ -85,7 +84,125 @@ def get_query_router(redis_client, embedding_model, neo4j_agent, database: Datab
             }
         )
 
+        # --- Per-chat memory used by the next prompts ---
+        await memory.append(user_id, chat_id, query_text, response)
+        # A new chat's context is stored once the chat exists
+        await client_contexts.save(user_id, chat_id, context)
+
+        # --- Store in Redis ---
+        await redis_client.setex(_answer_key(user_id, chat_id, query_for_agent), CACHE_TTL_SECONDS, json.dumps(response))
+        return chat_id
+
+    @router.post("/query")
+    async def process_query(request: QueryRequest, payload: dict = Depends(verify_jwt)):
+        user_id = int(payload["sub"])
+        query_text = request.query.strip()
+        if not query_text:
+            raise HTTPException(status_code=400, detail="Query is required")
+
+        context = await client_contexts.load(user_id, request.chat_id)
+        query_for_agent = _prepare_query(query_text, context)
+
+        # --- Redis cache ---
+        cached_response = await redis_client.get(_answer_key(user_id, request.chat_id, query_for_agent))
+        if cached_response:
+            return {"response": json.loads(cached_response)}
+
+        # --- Classify and get response ---
+        category = classify_query(query_for_agent)
+        if category == "product":
+            # --- Semantic cache: paraphrases of an answered question skip the LLM ---
+            query_vector = await embedding_service.embed(query_for_agent)
+            response = await semantic_cache.lookup(query_vector)
+            if response is None and _use_extractive(request.mode):
+                # Not stored in the semantic cache: the next LLM answer should be
+                response = await _answer_extractive(query_for_agent, request.mode)
+            elif response is None:
+                summary, history = await memory.load(user_id, request.chat_id)
+                async with llm_monitor.track():
+                    response = await  ask_bh_assurance(query_for_agent, retriever, clients.ollama, context_builder,
+                                                       history=history, summary=summary)
+                # The semantic cache is shared by every user: an answer drawing on this chat's
+                # earlier turns (possibly client data) stays out of it
+                if not is_fallback_answer(response) and not (history or summary):
+                    await semantic_cache.store(query_for_agent, query_vector, response)
+        else:
+            response = await neo4j_agent.execute_query(query_for_agent, context)
+
+        chat_id = await _save_answer(user_id, request.chat_id, query_text, query_for_agent, response,
+                                     category, context)
         return {"response": response, "chat_id": chat_id}
 
-    return router
+    @router.post("/query/stream")
+    async def process_query_stream(request: QueryRequest, payload: dict = Depends(verify_jwt)):
+        """
+        Same contract as /query, but the answer is sent as Server-Sent Events:
+        one `data: {"token": ...}` frame per fragment, then a final `event: done`
+        frame carrying the full response and the chat_id, or an `event: error`
+        frame if the answer fails midway.
+        """
+        user_id = int(payload["sub"])
+        query_text = request.query.strip()
+        if not query_text:
+            raise HTTPException(status_code=400, detail="Query is required")
 
+        async def answer_events():
+            context = await client_contexts.load(user_id, request.chat_id)
+            query_for_agent = _prepare_query(query_text, context)
+
+            # --- Redis cache ---
+            cached_response = await redis_client.get(_answer_key(user_id, request.chat_id, query_for_agent))
+            if cached_response:
+                response = json.loads(cached_response)
+                yield _sse({"token": response})
+                yield _sse({"response": response, "chat_id": request.chat_id}, event="done")
+                return
+
+            # --- Classify and relay the answer as it is generated ---
+            category = classify_query(query_for_agent)
+            if category == "product":
+                query_vector = await embedding_service.embed(query_for_agent)
+                response = await semantic_cache.lookup(query_vector)
+                if response is not None:
+                    yield _sse({"token": response})
+                elif _use_extractive(request.mode):
+                    response = await _answer_extractive(query_for_agent, request.mode)
+                    yield _sse({"token": response})
+                else:
+                    summary, history = await memory.load(user_id, request.chat_id)
+                    parts = []
+                    # An answer that breaks off midway raises: it is neither cached nor saved,
+                    # and event_stream reports it as an error
+                    async with llm_monitor.track():
+                        async for token in ask_bh_assurance_stream(query_for_agent, retriever, clients.ollama, context_builder,
+                                                                   history=history, summary=summary):
+                            parts.append(token)
+                            yield _sse({"token": token})
+                    response = "".join(parts).strip()
+                    # Shared by every user: only answers that did not draw on this chat's turns
+                    if not is_fallback_answer(response) and not (history or summary):
+                        await semantic_cache.store(query_for_agent, query_vector, response)
+            else:
+                response = await neo4j_agent.execute_query(query_for_agent, context)
+                yield _sse({"token": response})
+
+            chat_id = await _save_answer(user_id, request.chat_id, query_text, query_for_agent, response,
+                                         category, context)
+            yield _sse({"response": response, "chat_id": chat_id}, event="done")
+
+        async def event_stream():
+            # The status line is already sent: a failure can only be reported as an event
+            try:
+                async for frame in answer_events():
+                    yield frame
+            except Exception as e:
+                print(f"Streamed query failed: {e}")
+                yield _sse({"detail": "Erreur lors du traitement de la question"}, event="error")
+
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    return router
@@ -0,0 +1,111 @@
+import os
+import time
+import uuid
+from qdrant_client.http import models
+from dotenv import load_dotenv
+from embedding_cache import normalize_text
+
+load_dotenv()
+
+SEMANTIC_CACHE_COLLECTION = os.getenv("SEMANTIC_CACHE_COLLECTION", "response_cache")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 24 * 3600))
+# Expired entries are deleted by a store at most this often (per worker)
+SEMANTIC_CACHE_PURGE_SECONDS = int(os.getenv("SEMANTIC_CACHE_PURGE_SECONDS", 3600))
+
+
+class SemanticCache:
+    """
+    Product answers cached by query embedding in a dedicated Qdrant collection,
+    shared by every user: only answers generated without chat history are stored.
+    A lookup returns the stored answer of the nearest cached question when its
+    cosine similarity reaches `threshold` and the entry is younger than `ttl_seconds`.
+    Stores delete the expired entries every `purge_seconds`. The ingestion tool
+    drops the collection after re-indexing, which invalidates every cached
+    answer at once; it is recreated on the next store.
+    """
+
+    def __init__(self, qdrant_client, collection: str = SEMANTIC_CACHE_COLLECTION,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS,
+                 purge_seconds: int = SEMANTIC_CACHE_PURGE_SECONDS):
+        self.qdrant = qdrant_client
+        self.collection = collection
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.purge_seconds = purge_seconds
+        self._purged_at = 0.0
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "purges": 0}
+
+    async def _ensure_collection(self, dim: int):
+        if await self.qdrant.collection_exists(self.collection):
+            return
+        await self.qdrant.create_collection(
+            collection_name=self.collection,
+            vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+        )
+        await self.qdrant.create_payload_index(
+            collection_name=self.collection,
+            field_name="created_at",
+            field_schema=models.PayloadSchemaType.FLOAT,
+        )
+
+    async def lookup(self, vector) -> str | None:
+        try:
+            hits = await self.qdrant.search(
+                collection_name=self.collection,
+                query_vector=list(map(float, vector)),
+                query_filter=models.Filter(must=[
+                    models.FieldCondition(key="created_at", range=models.Range(gte=time.time() - self.ttl_seconds))
+                ]),
+                score_threshold=self.threshold,
+                with_payload=["answer"],
+                limit=1,
+            )
+        except Exception:
+            # Collection missing (first run or just invalidated) or Qdrant unavailable
+            hits = []
+        if hits:
+            self._stats["hits"] += 1
+            return hits[0].payload["answer"]
+        self._stats["misses"] += 1
+        return None
+
+    async def store(self, query: str, vector, answer: str) -> None:
+        point = models.PointStruct(
+            id=str(uuid.uuid5(uuid.NAMESPACE_URL, normalize_text(query))),
+            vector=list(map(float, vector)),
+            payload={"query": query, "answer": answer, "created_at": time.time()},
+        )
+        try:
+            await self._ensure_collection(len(point.vector))
+            await self.qdrant.upsert(collection_name=self.collection, points=[point])
+            self._stats["stores"] += 1
+        except Exception as e:
+            print(f"Semantic cache store failed: {e}")
+            return
+        if time.monotonic() - self._purged_at >= self.purge_seconds:
+            await self.purge_expired()
+
+    async def purge_expired(self) -> None:
+        """Delete the entries lookups no longer return (filtered on the indexed created_at)."""
+        self._purged_at = time.monotonic()
+        try:
+            await self.qdrant.delete(
+                collection_name=self.collection,
+                points_selector=models.FilterSelector(filter=models.Filter(must=[
+                    models.FieldCondition(key="created_at", range=models.Range(lt=time.time() - self.ttl_seconds))
+                ])),
+                wait=False,
+            )
+            self._stats["purges"] += 1
+        except Exception as e:
+            print(f"Semantic cache purge failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+        }
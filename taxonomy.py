@@ -0,0 +1,111 @@
+import os
+import re
+import unicodedata
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# neo4j: labels of the KG nodes, excel: the workbook loaded by KG/enhance_KG.py, none: no filtering.
+# The app matches questions and process_PDF/load_to_qdrant.py tags chunks with the same source.
+TAXONOMY_SOURCE = os.getenv("TAXONOMY_SOURCE", "neo4j")
+TAXONOMY_FILE = os.getenv("TAXONOMY_FILE", "KG/added_data/Description_garanties.xlsx")
+# Payload field of the chunk tags (see process_PDF/load_to_qdrant.py) -> workbook column
+TAXONOMY_FIELDS = {"branches": "LIB_BRANCHE", "produits": "LIB_PRODUIT", "garanties": "LIB_GARANTIE"}
+
+TAXONOMY_CYPHER = """
+MATCH (b:Branche) RETURN 'branches' AS field, b.lib_branche AS label
+UNION
+MATCH (p:Produit) RETURN 'produits' AS field, p.lib_produit AS label
+UNION
+MATCH (g:Garantie) RETURN 'garanties' AS field, g.lib_garantie AS label
+"""
+
+
+def taxonomy_key(text: str) -> str:
+    """Accent-, case- and punctuation-insensitive form used to match labels in text."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+
+class Taxonomy:
+    """
+    Branch, product and guarantee labels of the KG, found in free text. Chunks are
+    tagged with the same labels at ingest, so `match(query)` gives the values to
+    filter the product search on.
+    """
+
+    def __init__(self, labels: dict[str, list[str]]):
+        self._patterns = {}
+        for field, values in labels.items():
+            # "PACK BASIC" and "PACK BASIC+" share a key: a mention matches both labels
+            keys: dict[str, set[str]] = {}
+            for value in values:
+                if value and taxonomy_key(value):
+                    keys.setdefault(taxonomy_key(value), set()).add(value.strip())
+            if not keys:
+                continue
+            # Longest first, so "pack basic" wins over "pack"
+            alternatives = "|".join(re.escape(k) for k in sorted(keys, key=len, reverse=True))
+            self._patterns[field] = (re.compile(rf"\b(?:{alternatives})\b"), keys)
+
+    @classmethod
+    def from_excel(cls, path: str = TAXONOMY_FILE) -> "Taxonomy":
+        import pandas as pd
+        df = pd.read_excel(path)
+        return cls({field: df[column].dropna().astype(str).tolist() for field, column in TAXONOMY_FIELDS.items()})
+
+    @classmethod
+    def from_records(cls, records) -> "Taxonomy":
+        """From the (field, label) rows of TAXONOMY_CYPHER."""
+        labels: dict[str, list[str]] = {field: [] for field in TAXONOMY_FIELDS}
+        for record in records:
+            if record["label"]:
+                labels[record["field"]].append(record["label"])
+        return cls(labels)
+
+    @classmethod
+    async def from_neo4j(cls, driver, database: str | None = None) -> "Taxonomy":
+        records, _, _ = await driver.execute_query(TAXONOMY_CYPHER, database_=database, routing_="r")
+        return cls.from_records(records)
+
+    def match(self, text: str) -> dict[str, list[str]]:
+        """Labels mentioned in `text`, per payload field; fields without a mention are left out."""
+        key = taxonomy_key(text)
+        found = {}
+        for field, (pattern, keys) in self._patterns.items():
+            labels = sorted({label for m in pattern.findall(key) for label in keys[m]})
+            if labels:
+                found[field] = labels
+        return found
+
+    def tags(self, text: str) -> dict[str, list[str]]:
+        """Chunk payload tags: every field, empty when not mentioned, so re-tagging clears stale labels."""
+        found = self.match(text)
+        return {field: found.get(field, []) for field in TAXONOMY_FIELDS}
+
+
+async def load_taxonomy(driver=None, database: str | None = None, source: str = TAXONOMY_SOURCE) -> Taxonomy | None:
+    """The app's taxonomy, or None (unfiltered searches) when disabled or unavailable."""
+    try:
+        if source == "neo4j" and driver is not None:
+            return await Taxonomy.from_neo4j(driver, database)
+        if source == "excel":
+            return Taxonomy.from_excel()
+    except Exception as e:
+        print(f"Taxonomy unavailable, product searches will not be filtered: {e}")
+    return None
+
+
+def read_taxonomy(source: str = TAXONOMY_SOURCE) -> Taxonomy | None:
+    """The app's taxonomy for the ingestion scripts, read with a short-lived sync driver."""
+    if source == "excel":
+        return Taxonomy.from_excel()
+    if source != "neo4j":
+        return None
+    from neo4j import GraphDatabase
+    with GraphDatabase.driver(os.getenv("NEO4J_URI", ""),
+                              auth=(os.getenv("NEO4J_USER", ""), os.getenv("NEO4J_PASSWORD", ""))) as driver:
+        records, _, _ = driver.execute_query(TAXONOMY_CYPHER, database_=os.getenv("NEO4J_DATABASE") or None,
+                                             routing_="r")
+    return Taxonomy.from_records(records)
@@ -0,0 +1,92 @@
+import asyncio
+import numpy as np
+from agent_memory import MemoryIndex, MemoryLog
+
+
+def entry(query: str, cypher: str = "MATCH (n) RETURN n") -> dict:
+    return {"query": query, "cypher": cypher}
+
+
+def test_lexical_search_ranks_shared_rare_words_first():
+    index = MemoryIndex()
+    index.add(entry("Quels sont les sinistres du client"))
+    index.add(entry("Quelles garanties couvrent le contrat"))
+    index.add(entry("Quel est le capital assuré du contrat"))
+    assert index.search("garanties du contrat", k=1)[0]["query"] == "Quelles garanties couvrent le contrat"
+
+
+def test_same_question_replaces_the_older_entry():
+    index = MemoryIndex()
+    index.add(entry("Quels sont les sinistres du client ?", "OLD"), vector=np.ones(3))
+    index.add(entry("quels sont les  SINISTRES du client ?", "NEW"))
+    assert len(index) == 1
+    assert index.entries()[0]["cypher"] == "NEW"
+    # The vector of the question is kept, nothing to embed again
+    assert index.missing_vectors() == []
+
+
+def test_missing_vectors_are_tracked_incrementally():
+    index = MemoryIndex(max_entries=3)
+    for i, word in enumerate(["alpha", "bravo", "charlie", "delta"]):
+        index.add(entry(f"question {word}"), vector=np.ones(3) if word == "bravo" else None)
+    # "alpha" was evicted, "bravo" has its vector
+    assert [q for _, q in index.missing_vectors()] == ["question charlie", "question delta"]
+    assert [q for _, q in index.missing_vectors(1)] == ["question charlie"]
+    entry_id, _ = index.missing_vectors(1)[0]
+    index.set_vector(entry_id, np.ones(3))
+    assert [q for _, q in index.missing_vectors()] == ["question delta"]
+
+
+def test_vector_of_an_evicted_entry_is_ignored():
+    index = MemoryIndex(max_entries=1)
+    index.add(entry("question alpha"))
+    entry_id, _ = index.missing_vectors()[0]
+    index.add(entry("question bravo"))
+    index.set_vector(entry_id, np.ones(3))
+    assert [q for _, q in index.missing_vectors()] == ["question bravo"]
+
+
+def test_vector_search_uses_cosine_similarity():
+    index = MemoryIndex()
+    index.add(entry("question alpha"), vector=np.array([1.0, 0.0]))
+    index.add(entry("question bravo"), vector=np.array([0.0, 1.0]))
+    assert index.search("autre chose", k=1, vector=np.array([0.1, 0.9]))[0]["query"] == "question bravo"
+
+
+class FakeStreamRedis:
+    def __init__(self):
+        self.stream = []
+
+    async def xadd(self, name, fields, maxlen=None, approximate=True):
+        entry_id = f"{len(self.stream) + 1}-0"
+        self.stream.append((entry_id, dict(fields)))
+        return entry_id
+
+    async def xrange(self, name, min="-"):
+        after = min[1:] if min.startswith("(") else None
+        return [(i, f) for i, f in self.stream if after is None or int(i.split("-")[0]) > int(after.split("-")[0])]
+
+
+def test_log_round_trips_vectors_of_the_same_model():
+    redis = FakeStreamRedis()
+    log = MemoryLog(redis, model_name="model-a")
+    first = asyncio.run(log.append(entry("question alpha"), np.array([0.5, -1.0])))
+    asyncio.run(log.append(entry("question bravo")))
+    asyncio.run(MemoryLog(redis, model_name="model-b").append(entry("question charlie"), np.ones(2)))
+
+    records = asyncio.run(log.read_since())
+    assert [e["query"] for _, e, _ in records] == ["question alpha", "question bravo", "question charlie"]
+    assert records[0][2].tolist() == [0.5, -1.0]
+    # No vector, or one from another embedding model: embedded again by this worker
+    assert records[1][2] is None and records[2][2] is None
+    assert [e["query"] for _, e, _ in asyncio.run(log.read_since(first))] == ["question bravo", "question charlie"]
+
+
+def test_entries_not_embedded_yet_are_found_by_word_overlap():
+    index = MemoryIndex()
+    index.add(entry("Quelles garanties couvrent le contrat"))
+    index.add(entry("Quels sont les sinistres du client"), vector=np.array([1.0, 0.0]))
+    index.add(entry("Quel est le capital assuré"), vector=np.array([0.0, 1.0]))
+    found = index.search("Quelles garanties couvrent le contrat", k=2, vector=np.array([0.6, 0.8]))
+    assert found[0]["query"] == "Quelles garanties couvrent le contrat"
+    assert found[1]["query"] == "Quel est le capital assuré"
@@ -0,0 +1,52 @@
+import os
+import sys
+import pytest
+
+pytest.importorskip("fastembed")
+pytest.importorskip("qdrant_client")
+pytest.importorskip("PyPDF2")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "process_PDF"))
+from load_to_qdrant import REPO_ROOT, expand_sources, source_key, split_into_chunks
+from text_utils import count_tokens
+
+PAGE = {
+    "page_number": 3,
+    "content": "ARTICLE 5 - Vol\nLe vol du véhicule est couvert. Les accessoires sont exclus.\n"
+               "La franchise est de dix pour cent. Elle s'applique à chaque sinistre.",
+}
+
+
+def test_chunks_respect_the_token_budget_and_keep_their_section():
+    chunks = split_into_chunks([PAGE], max_tokens=12, overlap_tokens=0)
+    assert [c["chunk_index"] for c in chunks] == list(range(len(chunks)))
+    assert all(count_tokens(c["content"]) <= 12 for c in chunks)
+    assert {c["page_number"] for c in chunks} == {3}
+    assert {c["section"] for c in chunks} == {"ARTICLE 5 - Vol"}
+    assert " ".join(c["content"] for c in chunks) == (
+        "ARTICLE 5 - Vol Le vol du véhicule est couvert. Les accessoires sont exclus. "
+        "La franchise est de dix pour cent. Elle s'applique à chaque sinistre.")
+
+
+def test_overlap_carries_the_previous_sentence():
+    chunks = split_into_chunks([PAGE], max_tokens=16, overlap_tokens=8)
+    assert chunks[1]["content"].startswith("Les accessoires sont exclus.")
+
+
+def test_long_sentence_is_split_on_words():
+    chunks = split_into_chunks([{"page_number": 1, "content": " ".join(["mot"] * 25)}], max_tokens=10,
+                               overlap_tokens=0)
+    assert [count_tokens(c["content"]) for c in chunks] == [10, 10, 5]
+
+
+def test_source_key_is_the_same_however_the_path_is_spelled(monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    path = os.path.join("process_PDF", "x.pdf")
+    assert source_key(path) == source_key("./" + path) == source_key(os.path.join(REPO_ROOT, path)) == "process_PDF/x.pdf"
+
+
+def test_expand_sources_lists_each_file_once(tmp_path, monkeypatch):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "a.pdf").write_bytes(b"")
+    monkeypatch.chdir(tmp_path)
+    assert expand_sources(["docs", "./docs/a.pdf", str(tmp_path / "docs" / "a.pdf"), "docs/*.pdf"]) == [
+        os.path.join("docs", "a.pdf")]
@@ -0,0 +1,53 @@
+import asyncio
+import re
+import numpy as np
+from context_builder import ContextBuilder, drop_near_duplicates
+from text_utils import count_tokens
+
+VOCABULARY = ["vol", "incendie", "bris", "glace", "franchise", "assistance"]
+
+
+class FakeEmbeddingService:
+    """Bag of words over a small vocabulary: similarity is shared topic words."""
+
+    async def embed(self, text: str) -> np.ndarray:
+        words = re.findall(r"\w+", text.lower())
+        return np.array([words.count(w) for w in VOCABULARY], dtype=np.float32) + 1e-3
+
+    async def embed_many(self, texts: list[str]) -> list[np.ndarray]:
+        return [await self.embed(t) for t in texts]
+
+
+def build(builder: ContextBuilder, query: str, passages: list[str], history=(), summary: str = ""):
+    return asyncio.run(builder.build(query, passages, list(history), template_tokens=0, summary=summary))
+
+
+def test_near_duplicates_are_dropped():
+    passage = "La garantie vol couvre le vol du véhicule et de ses accessoires"
+    assert drop_near_duplicates([passage, passage + ".", "La garantie incendie couvre le feu"]) == [
+        passage, "La garantie incendie couvre le feu"]
+
+
+def test_passages_within_budget_are_kept_whole():
+    builder = ContextBuilder(FakeEmbeddingService(), token_budget=200)
+    context, history = build(builder, "vol", ["Le vol est couvert.", "La franchise est de 10%."])
+    assert context == "Le vol est couvert.\n\nLa franchise est de 10%."
+    assert history == ""
+
+
+def test_long_passage_is_trimmed_to_the_closest_sentences_in_order():
+    builder = ContextBuilder(FakeEmbeddingService(), token_budget=16, history_share=0)
+    passage = ("Le bris de glace est couvert. La franchise incendie est fixe. "
+               "Le vol du véhicule est couvert. L'assistance est incluse.")
+    context, _ = build(builder, "vol bris", [passage])
+    assert context == "Le bris de glace est couvert. Le vol du véhicule est couvert."
+    assert builder.stats()["trimmed_passages"] == 1
+
+
+def test_history_keeps_the_newest_turns_within_its_share():
+    builder = ContextBuilder(FakeEmbeddingService(), token_budget=100, history_share=0.2, history_max_turns=3)
+    turns = [("Question un ?", "Réponse un."), ("Question deux ?", "Réponse deux."),
+             ("Question trois ?", "Réponse trois.")]
+    _, history = build(builder, "vol", [], history=turns, summary="un résumé bien trop long pour tenir dans ce qui reste du budget")
+    assert history == "Previous conversation:\nQ: Question trois ?\nA: Réponse trois.\n"
+    assert count_tokens(history) <= 20 + count_tokens("Previous conversation:")
@@ -0,0 +1,50 @@
+from cypher_cache import parameterize, question_shape
+
+
+def test_questions_differing_only_in_entities_share_a_shape():
+    shape, entities = question_shape("Quels sont les sinistres du client 44849 ?")
+    other_shape, other_entities = question_shape("quels sont les sinistres du client 1183?")
+    assert shape == other_shape
+    assert (entities, other_entities) == ([44849], [1183])
+
+
+def test_entity_kinds():
+    shape, entities = question_shape("Le sinistre 20206000315 du matricule 0000716X est-il couvert par 'DEGATS DES EAUX' ?")
+    assert entities == [20206000315, "0000716X", "DEGATS DES EAUX"]
+    assert "<num>" in shape and "<code>" in shape and "<label>" in shape
+
+
+def test_apostrophes_are_not_quotes():
+    shape, entities = question_shape("Quel est l’état du sinistre numéro 20175000077 ?")
+    assert entities == [20175000077]
+    assert shape.startswith("quel est l’etat du sinistre numero <num>")
+
+
+def test_parameterize_replaces_the_question_entities():
+    cypher = ("MATCH (p {ref_personne: 44849})-[:A_SOUSCRIT]->(c)-[r:INCLUT]->(g {lib_garantie: 'VOL'}) "
+              "RETURN c.num_contrat LIMIT 10")
+    assert parameterize(cypher, [44849, "VOL"]) == (
+        "MATCH (p {ref_personne: $p0})-[:A_SOUSCRIT]->(c)-[r:INCLUT]->(g {lib_garantie: $p1}) "
+        "RETURN c.num_contrat LIMIT 10")
+
+
+def test_parameterize_leaves_longer_numbers_alone():
+    assert parameterize("MATCH (s {num_sinistre: 448490}) RETURN s", [44849]) is None
+
+
+def test_foreign_literals_make_a_query_unshareable():
+    # A matricule from the conversation context, not from the question
+    assert parameterize("MATCH (p {matricule_fiscale: '0000716X'}) RETURN p", []) is None
+    assert parameterize("MATCH (p {ref_personne: 1183}) RETURN p", []) is None
+
+
+def test_paging_counts_are_kept_as_literals():
+    assert parameterize("MATCH (p {ref_personne: 1183})-[:A_SOUSCRIT]->(c) RETURN c SKIP 20 LIMIT 100", [1183]) == (
+        "MATCH (p {ref_personne: $p0})-[:A_SOUSCRIT]->(c) RETURN c SKIP 20 LIMIT 100")
+    assert parameterize("MATCH (c) RETURN c LIMIT 1000", []) == "MATCH (c) RETURN c LIMIT 1000"
+
+
+def test_entity_equal_to_a_paging_count_is_not_shared():
+    # "contrats du client 100" must not be cached as LIMIT $p0, truncating "client 7" to 7 rows
+    assert parameterize("MATCH (p {ref_personne: 100})-[:A_SOUSCRIT]->(c) RETURN c LIMIT 100", [100]) is None
+    assert parameterize("MATCH (s:Sinistre) RETURN s ORDER BY s.date_declaration DESC limit 5", [5]) is None
@@ -0,0 +1,75 @@
+import pytest
+from cypher_templates import extract_params, match_template
+
+
+@pytest.mark.parametrize("question, template", [
+    ("Le sinistre numéro 20003000531 est-il couvert par les garanties du contrat associé ?", "sinistre_couverture"),
+    ("Donne-moi les garanties et leur capital assuré pour le contrat 2025611009101 ?", "contrat_garanties"),
+    ("Quel est le statut de paiement des contrats du client avec REF_PERSONNE 12106 ?", "client_paiement"),
+    ("Quel est le statut du sinistre numéro 20033000932  pour le client avec REF_PERSONNE 1183 ?", "sinistre_statut"),
+    ("Quels sont les contrats du client avec REF_PERSONNE 117578  ayant la garantie 'DECES - I.D.T' "
+     "et leur statut de paiement ?", "client_contrats_garantie_paiement"),
+    ("Quelles garanties sont souscrites par le client avec REF_PERSONNE 117578 , et quelles sont leurs descriptions ?",
+     "client_garanties"),
+    ("Le sinistre numéro 20206000315  est-il couvert par la garantie 'DEGATS DES EAUX' dans son contrat associé",
+     "sinistre_couvert_par_garantie"),
+    ("Quel est l’état du sinistre numéro 20175000077 pour le client avec REF_PERSONNE 331363 ?", "sinistre_statut"),
+    ("Quelles sont les garanties avec un capital assuré supérieur à 5000 pour le sinistre numéro 20193002051 ?",
+     "sinistre_garanties_capital_min"),
+    ("Quelles sont les garanties incluses dans tous les contrats du client avec REF_PERSONNE 247830 "
+     "ayant un capital assuré non nul ?", "client_garanties_capital_non_nul"),
+    ("Le sinistre numéro 20206000315 a-t-il une couverture pour 'RESPONSABILITE CIVILE' ?",
+     "sinistre_couvert_par_garantie"),
+    ("Quel est le statut des sinistres associés aux contrats du client avec REF_PERSONNE 44849", "client_sinistres"),
+    ("Quelles sont les descriptions des garanties couvrant le sinistre numéro 20195000008 ?",
+     "sinistre_garanties_descriptions"),
+    ("Quels sont mes sinistres ? (ref_personne est 1183)", "client_sinistres"),
+    ("Quels sont les contrats du client 1183 ? (matricule fiscale est 0000716X)", "client_contrats"),
+    ("Quand expire le contrat 2025611009101 ?", "contrat_details"),
+])
+def test_known_shapes_match(question, template):
+    match = match_template(question)
+    assert match is not None and match[0] == template
+
+
+@pytest.mark.parametrize("question", [
+    # Years, dates and comparatives
+    "Combien de sinistres le client 44849 a-t-il déclarés en 2023 ?",
+    "Quels contrats du client 1183 expirent avant 2025 ?",
+    "Quelles garanties du contrat 2025611009101 ont un capital supérieur à 10000 ?",
+    # A second entity type the query does not return
+    "Quels sinistres concernent le contrat 2025611009101 ?",
+    # Ordering, counting and state filters
+    "Donne-moi le sinistre le plus récent du client 1183",
+    "Combien de contrats a le client 1183 ?",
+    "Quels sont les contrats actifs du client 1183 ?",
+    "Quels sont les contrats résiliés du client 1183 ?",
+    # A label the query would ignore
+    "Quels sont les sinistres du client 1183 pour le produit 'AUTO' ?",
+    # A second identifier
+    "Quel est le statut du contrat 2025611009101 et du contrat 2025611009102 ?",
+    # No client, contract or claim identifier at all
+    "Quels sont les contrats ?",
+])
+def test_unhandled_qualifiers_fall_back_to_llm(question):
+    assert match_template(question) is None
+
+
+def test_parameters_are_typed_and_passed():
+    name, cypher, params = match_template(
+        "Quelles sont les garanties avec un capital assuré supérieur à 5000 pour le sinistre numéro 20193002051 ?")
+    assert params == {"num_sinistre": 20193002051, "capital_min": 5000.0}
+    assert "$capital_min" in cypher
+
+
+def test_client_lookup_follows_the_identifier():
+    _, by_ref, params = match_template("Quels sont les contrats du client 1183 ?")
+    assert "ref_personne: $ref_personne" in by_ref and params == {"ref_personne": 1183}
+    _, by_matricule, params = match_template("Quels sont mes contrats ? (matricule fiscale est 0000716x)")
+    assert "matricule_fiscale: $matricule_fiscale" in by_matricule and params == {"matricule_fiscale": "0000716X"}
+
+
+def test_labels_keep_their_spelling():
+    params = extract_params("Le sinistre numéro 20206000315 est-il couvert par la garantie 'Dégâts des eaux' ?")
+    assert params["lib_garantie"] == "Dégâts des eaux"
+    assert params["num_sinistre"] == 20206000315
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+
+pytest.importorskip("neo4j")
+from neo4j.exceptions import ClientError, ServiceUnavailable
+from cypher_validator import CypherValidator
+
+SCHEMA = {
+    "labels": {
+        "Personne": {"ref_personne", "nom_prenom", "matricule_fiscale"},
+        "Contrat": {"num_contrat", "lib_etat_contrat", "capital_assure"},
+        "Sinistre": {"num_sinistre", "lib_etat_sinistre"},
+    },
+    "relationships": {
+        "A_SOUSCRIT": set(),
+        "CONCERNE": {"date_declaration"},
+    },
+}
+
+
+def check(cypher: str) -> list[str]:
+    return CypherValidator(driver=None).check_schema(cypher, SCHEMA)
+
+
+def test_valid_query_has_no_problem():
+    assert check("MATCH (p:Personne {ref_personne: '1183'})-[:A_SOUSCRIT]->(c:Contrat) "
+                 "RETURN c.num_contrat, c.lib_etat_contrat") == []
+
+
+def test_unknown_label_suggests_the_closest():
+    problems = check("MATCH (c:Contrats) RETURN c")
+    assert len(problems) == 1
+    assert problems[0].startswith("Unknown label :Contrats") and "Contrat" in problems[0]
+
+
+def test_unknown_relationship_type():
+    assert any(p.startswith("Unknown relationship type :COUVRE") for p in check(
+        "MATCH (s:Sinistre)-[:COUVRE]->(c:Contrat) RETURN s"))
+
+
+def test_unknown_property_in_map_and_access():
+    problems = check("MATCH (s:Sinistre {numero: 1})-[r:CONCERNE]->(c:Contrat) "
+                     "RETURN s.etat, r.date_declaration")
+    assert any(p.startswith("Property 'numero' does not exist on :Sinistre") for p in problems)
+    assert any(p.startswith("Property 'etat' does not exist on s:Sinistre") and "lib_etat_sinistre" in p
+               for p in problems)
+    assert not any("date_declaration" in p for p in problems)
+
+
+def test_strings_and_comments_are_ignored():
+    assert check("// (x:Inconnu)\nMATCH (c:Contrat) WHERE c.num_contrat = '(y:Autre)' RETURN c") == []
+
+
+class FakeSession:
+    def __init__(self, error):
+        self.error = error
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query):
+        raise self.error
+
+
+class FakeDriver:
+    def __init__(self, error):
+        self.error = error
+
+    def session(self, database=None):
+        return FakeSession(self.error)
+
+
+def test_explain_reports_client_errors():
+    validator = CypherValidator(FakeDriver(ClientError("Invalid input 'RETRUN'")))
+    assert "RETRUN" in asyncio.run(validator.explain("MATCH (n) RETRUN n"))
+
+
+def test_explain_raises_other_errors():
+    validator = CypherValidator(FakeDriver(ServiceUnavailable("connection refused")))
+    with pytest.raises(ServiceUnavailable):
+        asyncio.run(validator.explain("MATCH (n) RETURN n"))
@@ -0,0 +1,27 @@
+import asyncio
+from llm_monitor import LLMLoadMonitor
+
+
+def test_agent_calls_count_towards_the_load():
+    monitor = LLMLoadMonitor(max_in_flight=2, latency_threshold=60.0)
+
+    async def run():
+        async with monitor.track():
+            async with monitor.track(answer=False):
+                assert monitor.in_flight == 2 and monitor.overloaded()
+        assert monitor.in_flight == 0 and not monitor.overloaded()
+
+    asyncio.run(run())
+    stats = monitor.stats()
+    assert (stats["llm_answers"], stats["agent_llm_calls"]) == (1, 1)
+
+
+def test_slow_calls_overload():
+    monitor = LLMLoadMonitor(max_in_flight=10, latency_threshold=0.0)
+
+    async def run():
+        async with monitor.track(answer=False):
+            pass
+
+    asyncio.run(run())
+    assert monitor.overloaded()
@@ -0,0 +1,16 @@
+from payload_store import PayloadStore
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "metadata.jsonl")
+    payloads = [{"text": "Garantie « vol »", "page": 1}, {"text": "ligne\nsuivante", "title": None}, {}]
+    PayloadStore.write(path, payloads)
+    store = PayloadStore(path)
+    assert len(store) == 3
+    assert [store[i] for i in range(3)] == payloads
+
+
+def test_empty_export(tmp_path):
+    path = str(tmp_path / "metadata.jsonl")
+    PayloadStore.write(path, [])
+    assert len(PayloadStore(path)) == 0
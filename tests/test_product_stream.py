@@ -0,0 +1,60 @@
+import asyncio
+import json
+import pytest
+
+for module in ("fastembed", "neo4j", "openai", "reportlab", "requests"):
+    pytest.importorskip(module)
+import httpx
+from context_builder import ContextBuilder
+from final_agent import OllamaStreamError, ask_bh_assurance_stream, is_fallback_answer
+
+
+class FakeRetriever:
+    async def search(self, query: str, limit: int = 3) -> list[dict]:
+        return [{"text": "La garantie bris de glace couvre le pare-brise."}]
+
+
+class ChunkStream(httpx.AsyncByteStream):
+    """NDJSON lines, then optionally a dropped connection."""
+
+    def __init__(self, lines: list[bytes], error: Exception | None = None):
+        self.lines = lines
+        self.error = error
+
+    async def __aiter__(self):
+        for line in self.lines:
+            yield line
+        if self.error is not None:
+            raise self.error
+
+
+def chunk(token: str, done: bool = False) -> bytes:
+    return json.dumps({"response": token, "done": done}).encode() + b"\n"
+
+
+def answer(lines: list[bytes], error: Exception | None = None) -> list[str]:
+    async def run():
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=ChunkStream(lines, error)))
+        async with httpx.AsyncClient(transport=transport) as client:
+            return [token async for token in ask_bh_assurance_stream(
+                "bris de glace ?", FakeRetriever(), client, ContextBuilder(embedding_service=None))]
+    return asyncio.run(run())
+
+
+def test_complete_answer():
+    assert "".join(answer([chunk("La garantie "), chunk("couvre."), chunk("", done=True)])) == "La garantie couvre."
+
+
+def test_failure_before_any_token_is_a_fallback_answer():
+    tokens = answer([], httpx.RemoteProtocolError("peer closed connection"))
+    assert len(tokens) == 1 and is_fallback_answer(tokens[0])
+
+
+@pytest.mark.parametrize("lines, error", [
+    ([chunk("La garantie "), chunk("bris de glace couvre ")], httpx.RemoteProtocolError("peer closed connection")),
+    ([chunk("La garantie "), b"{not json\n"], None),
+    ([chunk("La garantie ")], None),
+])
+def test_break_off_after_tokens_raises(lines, error):
+    with pytest.raises(OllamaStreamError):
+        answer(lines, error)
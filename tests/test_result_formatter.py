@@ -0,0 +1,57 @@
+import pytest
+from result_formatter import NO_RESULT_ANSWER, format_number, format_records, format_tnd, format_value
+
+
+@pytest.mark.parametrize("number, expected", [
+    (1234567.5, "1 234 567,5"),
+    (0.1, "0,1"),
+    (2.0, "2"),
+    (12.3456, "12,346"),
+    (1e20, "100 000 000 000 000 000 000"),
+    (-0.0001, "0"),
+])
+def test_format_number_is_fixed_point(number, expected):
+    assert format_number(number) == expected
+
+
+def test_format_tnd():
+    assert format_tnd(12345.5) == "12 345,500 TND"
+    assert format_tnd(1000) == "1 000 TND"
+
+
+def test_format_value():
+    assert format_value("capital_assure", 1234567.5) == "1 234 567,500 TND"
+    assert format_value("taux_responsabilite", 1234567.5) == "1 234 567,5"
+    assert format_value("num_contrat", 2025611009101) == "2025611009101"
+    assert format_value("date_survenance", "2023-04-05T00:00:00") == "05/04/2023"
+    assert format_value("couvert", True) == "Oui"
+    assert format_value("etat", None) == "non renseigné"
+
+
+def test_no_result():
+    assert format_records([]) == NO_RESULT_ANSWER
+
+
+def test_single_value():
+    assert format_records([{"lib_etat_sinistre": "Réglé"}]) == "État du sinistre : Réglé."
+
+
+def test_single_record():
+    assert format_records([{"num_contrat": 1, "capital_assure": 5000.0}]) == (
+        "- **Contrat n°** : 1\n- **Capital assuré** : 5 000 TND")
+
+
+def test_list_of_one_field_is_deduplicated():
+    assert format_records([{"num_sinistre": 1}, {"num_sinistre": 2}, {"num_sinistre": 1}]) == (
+        "2 sinistres trouvés :\n- 1\n- 2")
+
+
+def test_short_table():
+    assert format_records([{"garantie": "VOL", "couvert": True}, {"garantie": "INCENDIE", "couvert": None}]) == (
+        "2 garanties trouvées :\n- Garantie : VOL, Couvert : Oui\n- Garantie : INCENDIE")
+
+
+def test_large_or_nested_results_are_left_to_the_llm():
+    assert format_records([{"n": i} for i in range(21)]) is None
+    assert format_records([{"contrat": {"num_contrat": 1}}]) is None
+    assert format_records([{f"f{i}": i for i in range(7)}]) is None
@@ -0,0 +1,38 @@
+from taxonomy import Taxonomy, taxonomy_key
+
+TAXONOMY = Taxonomy({
+    "branches": ["AUTOMOBILE", "INCENDIE"],
+    "produits": ["PACK", "PACK BASIC", "PACK BASIC+"],
+    "garanties": ["DEGATS DES EAUX", "RESPONSABILITE CIVILE"],
+})
+
+
+def test_key_ignores_accents_case_and_punctuation():
+    assert taxonomy_key("  Dégâts-des  EAUX ! ") == "degats des eaux"
+
+
+def test_match_keeps_only_mentioned_fields():
+    assert TAXONOMY.match("Garantie dégâts des eaux en automobile") == {
+        "branches": ["AUTOMOBILE"], "garanties": ["DEGATS DES EAUX"]}
+    assert TAXONOMY.match("Quelles sont les conditions générales ?") == {}
+
+
+def test_longest_label_wins_and_shared_keys_match_every_label():
+    assert TAXONOMY.match("le pack basic couvre") == {"produits": ["PACK BASIC", "PACK BASIC+"]}
+    assert TAXONOMY.match("le pack couvre") == {"produits": ["PACK"]}
+
+
+def test_match_needs_whole_words():
+    assert TAXONOMY.match("package incendies") == {}
+
+
+def test_tags_list_every_field():
+    # Stored as is on the chunks: an empty field clears the labels of an earlier tagging
+    assert TAXONOMY.tags("responsabilité civile") == {
+        "branches": [], "produits": [], "garanties": ["RESPONSABILITE CIVILE"]}
+
+
+def test_from_records():
+    taxonomy = Taxonomy.from_records([{"field": "branches", "label": "INCENDIE"},
+                                      {"field": "garanties", "label": None}])
+    assert taxonomy.match("risque incendie") == {"branches": ["INCENDIE"]}
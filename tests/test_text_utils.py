@@ -0,0 +1,14 @@
+from text_utils import clean_content, count_tokens, split_sentences
+
+
+def test_count_tokens_counts_words_and_punctuation():
+    assert count_tokens("Le contrat n°12 est-il actif ?") == 10
+
+
+def test_split_sentences():
+    assert split_sentences("Première phrase. Deuxième : suite\n\nTroisième!  ") == [
+        "Première phrase.", "Deuxième :", "suite", "Troisième!"]
+
+
+def test_clean_content():
+    assert clean_content("  Titre\n \n\n\nTexte   avec  espaces  ") == "Titre\n\nTexte avec espaces"
@@ -0,0 +1,23 @@
+import re
+
+# Shared by the app and process_PDF/load_to_qdrant.py, so chunks are sized and cleaned
+# at ingest exactly as the prompt budget measures and cleans them at query time.
+
+# Word pieces and punctuation; a close, slightly conservative proxy for llama tokens
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+def count_tokens(text: str) -> int:
+    return len(TOKEN_RE.findall(text))
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in SENTENCE_SPLIT_RE.split(text) if s.strip()]
+
+
+def clean_content(raw_text: str) -> str:
+    """Collapse blank-line runs and repeated spaces of text extracted from a PDF."""
+    text = re.sub(r"\n\s*\n", "\n\n", raw_text)
+    text = re.sub(r" +", " ", text)
+    return text.strip()